@@ -0,0 +1,199 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import List, Tuple
+import argparse
+import re
+import subprocess
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+
+HEAVY = ("torch", "sentence_transformers", "transformers", "faiss", "sklearn", "fitz", "pymupdf",
+         "pytesseract", "PIL", "langdetect", "openai", "google.generativeai")
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)")
+
+
+def _parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    rows = []
+    for ln in stderr.splitlines():
+        m = _IMPORT_LINE.match(ln)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return rows
+
+def cmd_importtime(args: argparse.Namespace) -> int:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {args.module}"],
+        cwd=str(ROOT), capture_output=True, text=True,
+    )
+    rows = _parse_importtime(proc.stderr)
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:], file=sys.stderr)
+        return proc.returncode
+    total_us = sum(cum for _, _, cum, depth in rows if depth == 0)
+    key = 1 if args.sort == "self" else 2
+    print(f"import {args.module}: {total_us / 1000:.0f} ms total ({len(rows)} modules)\n")
+    print(f"{'self ms':>9} {'cum ms':>9}  module")
+    for name, self_us, cum_us, depth in sorted(rows, key=lambda r: -r[key])[: args.top]:
+        print(f"{self_us / 1000:9.1f} {cum_us / 1000:9.1f}  {name}")
+    names = {r[0] for r in rows}
+    loaded = [h for h in HEAVY if h in names]
+    print(f"\nheavy dependencies loaded: {', '.join(loaded) if loaded else 'none'}")
+    return 0
+
+
+def cmd_embed_server(args: argparse.Namespace) -> int:
+    from app.services.embed_server import serve
+    serve(args.socket, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    return 0
+
+
+def cmd_export_onnx(args: argparse.Namespace) -> int:
+    from app.services.embeddings import MODEL_NAME
+    from app.services.onnx_backend import export
+    path = export(MODEL_NAME, Path(args.out), quantize=not args.fp32)
+    print(f"exported {MODEL_NAME} to {path}; enable with EMBED_BACKEND=onnx EMBED_ONNX_DIR={args.out}")
+    return 0
+
+
+def cmd_embed_accuracy(args: argparse.Namespace) -> int:
+    import json
+    from app.services.embed_eval import compare
+    report = compare(args.backend, sample=args.sample, queries=args.queries, k=args.k,
+                     query_file=args.query_file, seed=args.seed)
+    print(json.dumps(report, indent=2))
+    return 0 if report["recallAtK"] >= args.min_recall else 1
+
+
+def cmd_index_recall(args: argparse.Namespace) -> int:
+    import json
+    from app.services.ann import measure_recall
+    from app.services.vector_store import open_segments, read_manifest
+    from app.utils.config import DATA_DIR
+    index_dir = DATA_DIR / "index"
+    snap = open_segments(index_dir, read_manifest(index_dir))
+    if snap.ntotal == 0:
+        print("index is empty", file=sys.stderr)
+        return 1
+    queries = None
+    if args.query_file:
+        from app.services.embeddings import encode_queries
+        lines = [ln.strip() for ln in args.query_file.read_text(encoding="utf-8").splitlines() if ln.strip()]
+        queries = encode_queries(lines)
+    report = measure_recall(snap, queries, n_queries=args.queries, k=args.k,
+                            ef_search=args.ef_search, nprobe=args.nprobe, seed=args.seed)
+    print(json.dumps(report, indent=2))
+    return 0 if report["recallAtK"] >= args.min_recall else 1
+
+
+def cmd_rebuild_index(args: argparse.Namespace) -> int:
+    from app.services.vector_store import VectorStore, read_manifest
+    from app.utils.config import DATA_DIR
+    store = VectorStore(DATA_DIR / "index")
+    n = store.compact()
+    cols = store.ensure_columns()
+    for e in read_manifest(store.index_dir)["segments"]:
+        print(f"{e['name']}  {e.get('kind', 'flat'):6} {e['ntotal']:>10}")
+    print(f"{n} segment(s) merged or rebuilt; column files written for {cols}")
+    return 0
+
+
+def cmd_backfill_registry(args: argparse.Namespace) -> int:
+    from app.services.ingest import backfill_registry
+    print(f"{backfill_registry()} existing document(s) added to the duplicate registry")
+    return 0
+
+
+def _index_bytes(seg_dir: Path) -> int:
+    return sum(p.stat().st_size for p in seg_dir.glob("*.index"))
+
+def cmd_migrate_index(args: argparse.Namespace) -> int:
+    import numpy as np
+    from app.services import ann
+    from app.services.vector_store import VectorStore, read_manifest
+    from app.utils.atomic import atomic_save_npy
+    from app.utils.config import DATA_DIR
+    ann.INDEX_STORAGE = args.storage
+    store = VectorStore(DATA_DIR / "index")
+    before = _index_bytes(store.seg_dir)
+    n = store.compact()
+    after = _index_bytes(store.seg_dir)
+    for e in read_manifest(store.index_dir)["segments"]:
+        print(f"{e['name']}  {e.get('kind', 'flat'):6} {e.get('storage', 'fp32'):5} {e['ntotal']:>10}")
+    print(f"{n} segment(s) rebuilt; index files {before / 2**20:.1f} MB -> {after / 2**20:.1f} MB")
+    if args.archives:
+        dtype = ann.archive_dtype()
+        converted = 0
+        for p in sorted((DATA_DIR / "vecs").glob("*.npy")):
+            vecs = np.load(p)
+            if vecs.dtype != dtype:
+                atomic_save_npy(p, vecs.astype(dtype))
+                converted += 1
+        print(f"{converted} document archive(s) rewritten as {dtype}")
+        from app.services import sentence_cache
+        print(f"{sentence_cache.convert(dtype)} cached sentence vector(s) rewritten as {dtype}")
+    print(f"set INDEX_STORAGE={args.storage} for every worker, or the next compaction converts the index back")
+    return 0
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Backend maintenance commands.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("importtime", help="report per-module import cost (python -X importtime)")
+    p.add_argument("module", nargs="?", default="app.main")
+    p.add_argument("--top", type=int, default=25)
+    p.add_argument("--sort", choices=("cumulative", "self"), default="cumulative")
+    p.set_defaults(func=cmd_importtime)
+
+    from app.services.embed_server import EMBED_SERVER_SOCKET, EMBED_MAX_BATCH, EMBED_MAX_WAIT_MS
+    p = sub.add_parser("embed-server", help="serve the embedding model to all workers over a UNIX socket")
+    p.add_argument("--socket", default=EMBED_SERVER_SOCKET or "/tmp/docintel-embed.sock")
+    p.add_argument("--max-batch", type=int, default=EMBED_MAX_BATCH)
+    p.add_argument("--max-wait-ms", type=float, default=EMBED_MAX_WAIT_MS)
+    p.set_defaults(func=cmd_embed_server)
+
+    from app.services.embeddings import EMBED_ONNX_DIR
+    p = sub.add_parser("export-onnx", help="export the embedding model to ONNX (int8 unless --fp32)")
+    p.add_argument("--out", default=str(EMBED_ONNX_DIR))
+    p.add_argument("--fp32", action="store_true", help="skip onnxruntime dynamic quantization")
+    p.set_defaults(func=cmd_export_onnx)
+
+    p = sub.add_parser("embed-accuracy", help="compare a quantized backend's retrieval against fp32")
+    p.add_argument("--backend", choices=("int8", "onnx"), default="int8")
+    p.add_argument("--sample", type=int, default=2000, help="indexed sentences to use as the corpus")
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--query-file", type=Path, default=None, help="one query per line instead of sampled sentences")
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--min-recall", type=float, default=0.0, help="exit 1 when recall@k falls below this")
+    p.set_defaults(func=cmd_embed_accuracy)
+
+    p = sub.add_parser("index-recall", help="recall@k of the ANN segments against an exact flat scan")
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--query-file", type=Path, default=None, help="one query per line instead of perturbed sentences")
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--ef-search", type=int, default=None)
+    p.add_argument("--nprobe", type=int, default=None)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--min-recall", type=float, default=0.0, help="exit 1 when recall@k falls below this")
+    p.set_defaults(func=cmd_index_recall)
+
+    p = sub.add_parser("rebuild-index", help="merge segments and rebuild any whose size calls for another INDEX_TYPE")
+    p.set_defaults(func=cmd_rebuild_index)
+
+    p = sub.add_parser("migrate-index", help="rewrite the index with another vector storage (fp32, fp16, sq8)")
+    p.add_argument("--storage", choices=("fp32", "fp16", "sq8"), required=True)
+    p.add_argument("--archives", action="store_true", help="also convert the per-document vector archives and the sentence cache")
+    p.set_defaults(func=cmd_migrate_index)
+
+    p = sub.add_parser("backfill-registry", help="hash documents ingested before duplicate detection into its registry")
+    p.set_defaults(func=cmd_backfill_registry)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
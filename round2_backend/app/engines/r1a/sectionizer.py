@@ -16,19 +16,20 @@ def _add_r1a_to_syspath():
 
 _add_r1a_to_syspath()
 
-from .src.extract import Span, extract_spans    
+from .src.extract import Span, extract_spans, EXTRACT_VERSION    
 from .src.features import filter_spans          
 from .src.classify import predict_headings      
 from .src.runner import detect_title            
 
+ENGINE_VERSION = f"s1-e{EXTRACT_VERSION}"
 
 
 def _sort_key(span: Span) -> Tuple[int, float, float]:
     return (int(span.page), float(span.bbox[1] if span.bbox else 0.0), float(span.bbox[0] if span.bbox else 0.0))
 
 
-def sectionize(pdf_path: Path) -> Dict:
-    spans: List[Span] = extract_spans(pdf_path)
+def sectionize(pdf_path: Path, cache_dir: Path | None = None) -> Dict:
+    spans: List[Span] = extract_spans(pdf_path, cache_dir=cache_dir)
     if isinstance(spans, tuple):  
         spans = spans[0]
     if not spans:
@@ -0,0 +1,14 @@
+from __future__ import annotations
+import os, pathlib, threading
+
+# the engine runs standalone (dump.py, sectionizer's sys.path hook), so it keeps its own copy
+# of app.utils.atomic's text writer rather than importing from the app
+
+
+def atomic_write_text(path: pathlib.Path, text: str, encoding: str = "utf-8") -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        tmp.write_text(text, encoding=encoding)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
@@ -3,7 +3,6 @@ import re
 from typing import List
 
 import numpy as np
-from sklearn.cluster import KMeans
 
 from .extract import Span
 from .features import build_matrix
@@ -31,6 +30,7 @@ def predict_headings(spans: List[Span]) -> List[Span]:
     if not cand:
         return []
 
+    from sklearn.cluster import KMeans
     fs     = np.array([float(s.font_size) for s in cand]).reshape(-1, 1)
     k      = min(4, np.unique(fs).size)
     labels = KMeans(n_clusters=k, n_init="auto", random_state=0).fit_predict(fs)
@@ -1,16 +1,51 @@
 from __future__ import annotations
-import pathlib, re, fitz
-from dataclasses import dataclass
-from typing import List, Tuple, Dict
-from PIL import Image
-import pytesseract
-from langdetect import detect, DetectorFactory
+import hashlib, json, multiprocessing, os, pathlib, re, threading, fitz
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Tuple, Dict, TYPE_CHECKING
+import numpy as np
 
-DetectorFactory.seed = 0
+from ._atomic import atomic_write_text
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# PIL, pytesseract and langdetect are only needed for OCR / language detection
+# and are imported on first use to keep text-only extraction cheap to load
 
 SECTION_NUM_RE = re.compile(r"^\d+(\.\d+)+\s?$")   
 NUM_HDR_RE     = re.compile(r"^\d+(\.\d+)+\s")    
 
+EXTRACT_WORKERS    = int(os.getenv("R1A_EXTRACT_WORKERS", "1"))    # 0 = one per core
+PARALLEL_MIN_PAGES = int(os.getenv("R1A_PARALLEL_MIN_PAGES", "16"))
+LANG_SAMPLE_CHARS  = 2000
+EXTRACT_VERSION    = "3"     # bump whenever per-page extraction output changes; keys the page cache
+
+OCR_LANGS          = os.getenv("R1A_OCR_LANGS", "eng+jpn+hin")    # used when script detection is inconclusive
+OCR_SCRIPT_LANGS   = {"Latin": "eng", "Japanese": "jpn", "Han": "jpn", "Hiragana": "jpn",
+                      "Katakana": "jpn", "Devanagari": "hin"}
+OCR_PROBE_DPI      = 72
+OCR_MIN_DPI        = 150     # below this tesseract misreads small print, whatever the estimate says
+OCR_MAX_DPI        = 300
+OCR_TARGET_LINE_PX = 32      # rendered line height tesseract reads most reliably
+OCR_MARGIN         = 0.04    # fraction of each edge ignored when measuring, where scan borders sit
+OCR_MIN_LINES      = 3       # fewer measurable text lines than this is no basis for an estimate
+OCR_BLANK_INK      = 0.002   # pages with less dark-pixel coverage are skipped
+
+
+class _LangSample:
+    __slots__ = ("text", "value")
+
+    def __init__(self, text: str):
+        self.text = text[:LANG_SAMPLE_CHARS]
+        self.value: str | None = None
+
+    def get(self) -> str:
+        if self.value is None:
+            self.value = _guess_lang(self.text)
+        return self.value
+
 
 @dataclass
 class Span:
@@ -21,20 +56,105 @@ class Span:
     font_name: str
     is_bold: bool
     is_italic: bool
-    lang: str
+    lang_src: _LangSample | None = field(default=None, repr=False, compare=False)
     level: str | None = None
 
+    @property
+    def lang(self) -> str:
+        # detected once per page from a text sample, and only when asked for
+        if self.lang_src is None:
+            self.lang_src = _LangSample(self.text)
+        return self.lang_src.get()
+
+
+@lru_cache(maxsize=1)
+def _detect():
+    from langdetect import detect, DetectorFactory
+    DetectorFactory.seed = 0
+    return detect
+
 
 def _guess_lang(t: str) -> str:
     try:
-        return detect(t)
+        return _detect()(t)
     except Exception:
         return "und"
 
 
-def _ocr_page_lines(pix: fitz.Pixmap, langs: str = "eng+jpn+hin") -> List[Span]:
+@lru_cache(maxsize=1)
+def _installed_langs() -> frozenset:
+    import pytesseract
+    try:
+        return frozenset(pytesseract.get_languages(config=""))
+    except Exception:
+        return frozenset()
+
+
+def _gray_pixmap(page: fitz.Page, dpi: int) -> Tuple[Image.Image, np.ndarray]:
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    from PIL import Image
+    arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, : pix.width]
+    return Image.frombytes("L", [pix.width, pix.height], arr.tobytes()), arr
+
+
+def _line_height_px(gray: np.ndarray) -> float | None:
+    h, w = gray.shape
+    dy, dx = int(h * OCR_MARGIN), int(w * OCR_MARGIN)
+    ink = gray[dy:h - dy, dx:w - dx] < 128
+    if ink.size == 0:
+        return None
+    # vertical rules and borders put ink in every row and horizontal bars fill a row; neither is text
+    ink = ink[:, ink.mean(axis=0) < 0.5]
+    frac = ink.mean(axis=1) if ink.shape[1] else np.zeros(ink.shape[0])
+    rows = (frac > 0.002) & (frac < 0.5)
+    runs, n = [], 0
+    for r in rows:
+        if r:
+            n += 1
+        elif n:
+            runs.append(n)
+            n = 0
+    if n:
+        runs.append(n)
+    runs = [r for r in runs if 2 <= r <= len(rows) // 4]
+    return float(np.median(runs)) if len(runs) >= OCR_MIN_LINES else None
+
+
+def _pick_ocr_langs(img: Image.Image) -> Tuple[str, int]:
+    import pytesseract
+    from pytesseract import Output
+    try:
+        osd = pytesseract.image_to_osd(img, output_type=Output.DICT)
+    except Exception:
+        return OCR_LANGS, 0
+    langs = OCR_SCRIPT_LANGS.get(str(osd.get("script", "")))
+    installed = _installed_langs()
+    if not langs or float(osd.get("script_conf", 0)) < 1.0 or (installed and langs not in installed):
+        langs = OCR_LANGS
+    return langs, int(osd.get("rotate", 0) or 0)
+
+
+def _ocr_page(page: fitz.Page, dpi: int) -> List[Span]:
+    _, probe = _gray_pixmap(page, OCR_PROBE_DPI)
+    if probe.size == 0 or (probe < 128).mean() < OCR_BLANK_INK:
+        return []
+
+    line_px = _line_height_px(probe)
+    if line_px:
+        dpi = int(min(OCR_MAX_DPI, max(OCR_MIN_DPI, OCR_PROBE_DPI * OCR_TARGET_LINE_PX / line_px)))
+    else:
+        dpi = max(OCR_MIN_DPI, dpi)
+    img, _ = _gray_pixmap(page, dpi)
+
+    langs, rotate = _pick_ocr_langs(img)
+    if rotate:
+        img = img.rotate(-rotate, expand=True)
+    return _ocr_page_lines(img, langs, scale=72.0 / dpi)
+
+
+def _ocr_page_lines(img: Image.Image, langs: str = "eng+jpn+hin", scale: float = 1.0) -> List[Span]:
+    import pytesseract
     from pytesseract import Output
-    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
     data = pytesseract.image_to_data(img, lang=langs, output_type=Output.DICT)
 
     n = len(data["text"])
@@ -67,17 +187,16 @@ def _ocr_page_lines(pix: fitz.Pixmap, langs: str = "eng+jpn+hin") -> List[Span]:
         line_text = " ".join(g["words"]).strip()
         if not line_text:
             continue
-        font_size = float(sum(g["hs"]) / max(1, len(g["hs"])))
+        font_size = float(sum(g["hs"]) / max(1, len(g["hs"]))) * scale
         spans.append(
             Span(
                 text=line_text,
                 page=0,  # filled below
-                bbox=(float(g["l"]), float(g["t"]), float(g["r"]), float(g["b"])),
+                bbox=(g["l"] * scale, g["t"] * scale, g["r"] * scale, g["b"] * scale),
                 font_size=font_size,
                 font_name="OCR",
                 is_bold=False,
                 is_italic=False,
-                lang=_guess_lang(line_text),
             )
         )
 
@@ -125,42 +244,130 @@ def _merge_line_spans(raw: List[Span]) -> List[Span]:
     return merged
 
 
-def extract_spans(pdf_path: pathlib.Path, dpi: int = 150) -> List[Span]:
-    doc = fitz.open(pdf_path)
-    spans: List[Span] = []
-    for i in range(doc.page_count):
-        page = doc.load_page(i)
-        d = page.get_text("dict")
-
-        if not any(b["type"] == 0 for b in d["blocks"]):  
-            for sp in _ocr_page_lines(page.get_pixmap(dpi=dpi)):
-                sp.page = i + 1
-                spans.append(sp)
+def _share_lang_sample(spans: List[Span]) -> List[Span]:
+    sample = _LangSample(" ".join(s.text for s in spans))
+    for s in spans:
+        s.lang_src = sample
+    return spans
+
+
+def _extract_page(page: fitz.Page, page_no: int, dpi: int) -> List[Span]:
+    d = page.get_text("dict")
+
+    if not any(b["type"] == 0 for b in d["blocks"]):  
+        spans = _ocr_page(page, dpi)
+        for sp in spans:
+            sp.page = page_no
+        return _share_lang_sample(spans)
+
+    raw: List[Span] = []
+    for b in d["blocks"]:
+        if b["type"] != 0:
             continue
+        for l in b["lines"]:
+            for s in l["spans"]:
+                txt = (s["text"] or "").strip()
+                if not txt:
+                    continue
+                raw.append(
+                    Span(
+                        text=txt,
+                        page=page_no,
+                        bbox=tuple(s["bbox"]),
+                        font_size=float(s["size"]),
+                        font_name=str(s["font"]),
+                        is_bold=bool(s["flags"] & 2),
+                        is_italic=bool(s["flags"] & 1),
+                    )
+                )
+    raw.sort(key=lambda s: (s.page, s.bbox[1], s.bbox[0]))
+    return _share_lang_sample(_merge_line_spans(raw))
+
+
+def _page_key(doc: fitz.Document, page: fitz.Page, dpi: int) -> str:
+    h = hashlib.sha256(f"{EXTRACT_VERSION}|{dpi}|{tuple(page.rect)}|{page.rotation}".encode())
+    h.update(page.read_contents())
+    for f in page.get_fonts():
+        h.update(repr(f[1:6]).encode())
+    for xref in [im[0] for im in page.get_images(full=True)] + [xo[0] for xo in page.get_xobjects()]:
+        h.update(hashlib.sha256(doc.xref_stream_raw(xref) or b"").digest())
+    return h.hexdigest()
+
+
+def _load_cached_page(path: pathlib.Path, page_no: int) -> List[Span] | None:
+    try:
+        rows = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    spans = [Span(**{**r, "bbox": tuple(r["bbox"]), "page": page_no}) for r in rows]
+    return _share_lang_sample(spans)
 
-        raw: List[Span] = []
-        for b in d["blocks"]:
-            if b["type"] != 0:
+
+def _store_cached_page(path: pathlib.Path, spans: List[Span]) -> None:
+    rows = [{"text": s.text, "page": s.page, "bbox": list(s.bbox), "font_size": s.font_size,
+             "font_name": s.font_name, "is_bold": s.is_bold, "is_italic": s.is_italic, "level": s.level}
+            for s in spans]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_text(path, json.dumps(rows, ensure_ascii=False))
+
+
+def _extract_range(pdf_path: str, start: int, stop: int, dpi: int, cache_dir: str | None = None) -> List[Span]:
+    doc = fitz.open(pdf_path)
+    try:
+        spans: List[Span] = []
+        for i in range(start, stop):
+            page = doc.load_page(i)
+            if cache_dir is None:
+                spans.extend(_extract_page(page, i + 1, dpi))
                 continue
-            for l in b["lines"]:
-                for s in l["spans"]:
-                    txt = (s["text"] or "").strip()
-                    if not txt:
-                        continue
-                    raw.append(
-                        Span(
-                            text=txt,
-                            page=i + 1,
-                            bbox=tuple(s["bbox"]),
-                            font_size=float(s["size"]),
-                            font_name=str(s["font"]),
-                            is_bold=bool(s["flags"] & 2),
-                            is_italic=bool(s["flags"] & 1),
-                            lang=_guess_lang(txt),
-                        )
-                    )
-        raw.sort(key=lambda s: (s.page, s.bbox[1], s.bbox[0]))
-        spans.extend(_merge_line_spans(raw))
+            key = _page_key(doc, page, dpi)
+            path = pathlib.Path(cache_dir) / key[:2] / f"{key}.json"
+            page_spans = _load_cached_page(path, i + 1) if path.exists() else None
+            if page_spans is None:
+                page_spans = _extract_page(page, i + 1, dpi)
+                _store_cached_page(path, page_spans)
+            spans.extend(page_spans)
+        return spans
+    finally:
+        doc.close()
+
 
+_pool: ProcessPoolExecutor | None = None
+_pool_size = 0
+# ingest dispatcher threads extract concurrently; without the lock two of them can each start a pool
+_pool_lock = threading.Lock()
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn: the caller may already hold torch/OpenMP threads that fork would not survive
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_size = workers
+        return _pool
+
+
+def extract_spans(pdf_path: pathlib.Path, dpi: int = 150, workers: int | None = None,
+                  cache_dir: pathlib.Path | None = None) -> List[Span]:
+    if workers is None:
+        workers = EXTRACT_WORKERS or (os.cpu_count() or 1)
+    doc = fitz.open(pdf_path)
+    page_count = doc.page_count
     doc.close()
+    cache = str(cache_dir) if cache_dir else None
+
+    if workers <= 1 or page_count < PARALLEL_MIN_PAGES:
+        return _extract_range(str(pdf_path), 0, page_count, dpi, cache)
+
+    # several contiguous ranges per worker so one slow OCR range does not idle the rest
+    step = max(PARALLEL_MIN_PAGES // 4, -(-page_count // (workers * 4)))
+    starts = list(range(0, page_count, step))
+    stops = [min(page_count, s + step) for s in starts]
+    pool = _get_pool(workers)
+    spans: List[Span] = []
+    n = len(starts)
+    for part in pool.map(_extract_range, [str(pdf_path)] * n, starts, stops, [dpi] * n, [cache] * n):
+        spans.extend(part)
     return spans
@@ -1,6 +1,6 @@
 from __future__ import annotations
-import os
 from pathlib import Path
+import threading
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -18,6 +18,9 @@ from slowapi.errors import RateLimitExceeded
 from slowapi import _rate_limit_exceeded_handler
 
 from app.middleware.max_body import MaxBodyLimitMiddleware
+from app.utils.config import MAX_UPLOAD_BYTES
+from app.services.ingest import backfill_registry, resume_pending, shutdown_scheduler
+from app.services.warmup import start_warmup
 from starlette.staticfiles import StaticFiles  
 
 load_dotenv(dotenv_path=Path(__file__).resolve().parent.parent / ".env")
@@ -37,10 +40,9 @@ if RL_ENABLED:
     app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
     app.add_middleware(SlowAPIMiddleware)
 
-_max_mb = int(os.getenv("MAX_UPLOAD_MB", "50"))
 app.add_middleware(
     MaxBodyLimitMiddleware,
-    max_body_size=_max_mb * 1024 * 1024,
+    max_body_size=MAX_UPLOAD_BYTES,
     paths_prefixes=["/api/upload"],
 )
 
@@ -54,6 +56,29 @@ app.include_router(related_router.router, prefix="/api/answer")
 app.include_router(insights_router.router, prefix="/api/answer")
 app.include_router(blocklist_router.router, prefix="/api")  # /api/admin/blocklist/*
 
+@app.on_event("startup")
+def _resume_ingest():
+    n = resume_pending()
+    if n:
+        print(f"[BOOT] Resumed {n} interrupted ingest job(s)")
+
+@app.on_event("startup")
+def _backfill_registry():
+    # hashes only documents the registry has not seen, so after the first boot this is a directory listing
+    def run():
+        n = backfill_registry()
+        if n:
+            print(f"[BOOT] Registered {n} existing document(s) for duplicate detection")
+    threading.Thread(target=run, name="registry-backfill", daemon=True).start()
+
+@app.on_event("startup")
+def _warm_up():
+    start_warmup()
+
+@app.on_event("shutdown")
+def _stop_ingest():
+    shutdown_scheduler()
+
 STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
 if STATIC_DIR.exists():
     app.mount("/", StaticFiles(directory=str(STATIC_DIR), html=True), name="static")
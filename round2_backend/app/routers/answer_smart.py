@@ -1,6 +1,7 @@
 import os
 from fastapi import APIRouter, HTTPException, Request
 from app.schemas.qa import AnswerSmartRequest, AnswerSmartResponse
+from starlette.concurrency import run_in_threadpool
 from app.services.answer import smart_answer
 from app.utils.ratelimit import limiter
 
@@ -12,7 +13,8 @@ async def post_answer_smart(request: Request, req: AnswerSmartRequest):
     if not (req.query or "").strip():
         raise HTTPException(status_code=400, detail="Query must not be empty.")
 
-    out = smart_answer(
+    out = await run_in_threadpool(
+        smart_answer,
         query=req.query,
         k=req.k,
         persona=req.persona,
@@ -1,6 +1,18 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.services import warmup
+from app.services.embeddings import embed_stats
+
 router = APIRouter()
 
 @router.get("/healthz")
 def healthz():
     return {"ok": True}
+
+@router.get("/readyz")
+def readyz():
+    return JSONResponse(warmup.status(), status_code=200 if warmup.is_ready() else 503)
+
+@router.get("/stats/embeddings")
+def embedding_stats():
+    return embed_stats()
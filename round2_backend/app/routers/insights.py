@@ -1,6 +1,7 @@
 from typing import List, Optional
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from app.services.answer import smart_answer
 
 router = APIRouter(tags=["insights"])
@@ -32,7 +33,8 @@ async def insights(req: InsightsReq):
     if not q:
         raise HTTPException(status_code=400, detail="Query must not be empty.")
 
-    out = smart_answer(
+    out = await run_in_threadpool(
+        smart_answer,
         query=q,
         k=max(1, req.k),
         deep=req.deep,
@@ -1,6 +1,7 @@
 from typing import List, Optional
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
 from app.services.answer import smart_answer
 
 router = APIRouter(tags=["related"])
@@ -10,6 +11,9 @@ class RelatedReq(BaseModel):
     k: int = 5
     deep: bool = False
     docIds: Optional[List[str]] = None 
+    # ANN accuracy/latency knobs; ignored by flat segments
+    efSearch: Optional[int] = Field(default=None, ge=1, le=4096)
+    nprobe: Optional[int] = Field(default=None, ge=1, le=65536)
 
 class RelatedHit(BaseModel):
     docId: Optional[str] = None
@@ -31,13 +35,16 @@ async def related(req: RelatedReq):
     if not q:
         raise HTTPException(status_code=400, detail="Query must not be empty.")
 
-    out = smart_answer(
+    out = await run_in_threadpool(
+        smart_answer,
         query=q,
         k=max(1, req.k),
         deep=req.deep,
         doc_filter=req.docIds,
         task="search-only",  
         format="none",
+        ef_search=req.efSearch,
+        nprobe=req.nprobe,
     )
 
     sources = out.get("sources") or []
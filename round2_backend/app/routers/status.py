@@ -1,13 +1,103 @@
-from fastapi import APIRouter, HTTPException
-from pathlib import Path
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Dict, List, Optional
+import asyncio
 import json
-from app.utils.config import DATA_DIR
+from app.services import doc_registry, jobs
+from app.schemas.api import BatchStatusRequest, BatchStatusResponse
 
 router = APIRouter(tags=["status"])
 
+HEARTBEAT_S = 15.0
+STORE_POLL_S = 1.0
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _event_stream(request: Request, job_ids: List[str]):
+    sub = jobs.registry.subscribe(job_ids)
+    try:
+        last: Dict[str, Optional[dict]] = {}
+        for j in job_ids:
+            last[j] = jobs.lookup(j)
+            yield _sse("progress", last[j] or {"jobId": j, "status": "unknown"})
+        idle = 0.0
+        while not all(jobs.is_terminal(st) for st in last.values()):
+            if await request.is_disconnected():
+                return
+            try:
+                st = await asyncio.wait_for(sub.queue.get(), timeout=STORE_POLL_S)
+            except asyncio.TimeoutError:
+                idle += STORE_POLL_S
+                # jobs owned by another worker never reach this registry; follow them via the store
+                for j, prev in last.items():
+                    if jobs.registry.get(j) is None and not jobs.is_terminal(prev):
+                        st = jobs.lookup(j)
+                        if st and st != prev:
+                            last[j] = st
+                            yield _sse("progress", st)
+                if idle >= HEARTBEAT_S:
+                    idle = 0.0
+                    yield ": keepalive\n\n"
+                continue
+            idle = 0.0
+            last[st["jobId"]] = st
+            yield _sse("progress", st)
+        yield _sse("end", {"jobIds": job_ids})
+    finally:
+        jobs.registry.unsubscribe(sub)
+
+def _stream(request: Request, job_ids: List[str]) -> StreamingResponse:
+    return StreamingResponse(
+        _event_stream(request, job_ids),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+MAX_BATCH_JOBS = 1000
+
+
+def _batch_ids(batch_id: str) -> List[str]:
+    job_ids = jobs.batch_jobs(batch_id)
+    if job_ids is None:
+        raise HTTPException(status_code=404, detail="batch not found")
+    return job_ids
+
+@router.post("/status/batch", response_model=BatchStatusResponse)
+def batch_status(req: BatchStatusRequest):
+    job_ids = list(dict.fromkeys(req.jobIds))
+    if not job_ids:
+        raise HTTPException(status_code=400, detail="Provide at least one job id.")
+    if len(job_ids) > MAX_BATCH_JOBS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_JOBS} job ids per request.")
+    return jobs.summarize(job_ids)
+
+@router.get("/status/batch/{batch_id}", response_model=BatchStatusResponse)
+def batch_status_by_id(batch_id: str):
+    return {"batchId": batch_id, **jobs.summarize(_batch_ids(batch_id))}
+
+@router.get("/status/batch/{batch_id}/events")
+async def stream_batch(request: Request, batch_id: str):
+    return _stream(request, _batch_ids(batch_id))
+
+@router.get("/status/events")
+async def stream_many(request: Request, jobs_param: str = Query(..., alias="jobs")):
+    job_ids = [j for j in (s.strip() for s in jobs_param.split(",")) if j]
+    if not job_ids:
+        raise HTTPException(status_code=400, detail="Provide at least one job id.")
+    return _stream(request, list(dict.fromkeys(job_ids)))
+
 @router.get("/status/{job_id}")
 def get_status(job_id: str):
-    p = DATA_DIR / "tmp" / f"{job_id}.json"
-    if not p.exists():
+    st = jobs.lookup(job_id)
+    if not st:
         raise HTTPException(status_code=404, detail="job not found")
-    return json.loads(p.read_text())
+    # other file names the same document was uploaded under
+    names = doc_registry.aliases(st["docId"]) if st.get("docId") else []
+    return {**st, "aliases": names} if names else st
+
+@router.get("/status/{job_id}/events")
+async def stream_one(request: Request, job_id: str):
+    return _stream(request, [job_id])
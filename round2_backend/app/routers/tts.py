@@ -1,3 +1,4 @@
+import importlib.util
 import os
 import uuid
 from typing import Optional, List, Dict
@@ -10,25 +11,26 @@ from pydantic import BaseModel
 from app.utils.config import DATA_DIR
 from app.utils.ratelimit import limiter
 
-_AZURE_OAI_OK = False
+_AZURE_OAI_ENDPOINT = (os.getenv("AZURE_OPENAI_ENDPOINT") or "").rstrip("/")
+_AZURE_OAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
+_AZURE_OAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-07-01-preview")
+_AZURE_TTS_DEPLOYMENT = os.getenv("AZURE_TTS_DEPLOYMENT") 
+
+# the openai client is imported on the first synthesis call; find_spec only checks it is installed
+_AZURE_OAI_OK = bool(_AZURE_OAI_ENDPOINT and _AZURE_OAI_API_KEY and _AZURE_TTS_DEPLOYMENT) \
+    and importlib.util.find_spec("openai") is not None
 _client_azure_oai = None
-try:
-    from openai import AzureOpenAI 
-    _AZURE_OAI_ENDPOINT = (os.getenv("AZURE_OPENAI_ENDPOINT") or "").rstrip("/")
-    _AZURE_OAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-    _AZURE_OAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-07-01-preview")
-    _AZURE_TTS_DEPLOYMENT = os.getenv("AZURE_TTS_DEPLOYMENT") 
 
-    if _AZURE_OAI_ENDPOINT and _AZURE_OAI_API_KEY and _AZURE_TTS_DEPLOYMENT:
+def _azure_client():
+    global _client_azure_oai
+    if _client_azure_oai is None:
+        from openai import AzureOpenAI 
         _client_azure_oai = AzureOpenAI(
             azure_endpoint=_AZURE_OAI_ENDPOINT,
             api_key=_AZURE_OAI_API_KEY,
             api_version=_AZURE_OAI_API_VERSION,
         )
-        _AZURE_OAI_OK = True
-except Exception:
-    _AZURE_OAI_OK = False
-    _client_azure_oai = None
+    return _client_azure_oai
 
 _TTS_SDK = None
 _TTS_HTTP = None
@@ -113,8 +115,9 @@ def _openai_voices_list() -> List[Dict]:
 
 
 def _synthesize_openai_tts(text: str, voice: Optional[str], fmt: Optional[str]) -> Dict:
-    if not _AZURE_OAI_OK or not _client_azure_oai:
+    if not _AZURE_OAI_OK:
         raise RuntimeError("Azure OpenAI TTS not configured.")
+    client = _azure_client()
 
     dep = _AZURE_TTS_DEPLOYMENT
     if not dep:
@@ -128,11 +131,11 @@ def _synthesize_openai_tts(text: str, voice: Optional[str], fmt: Optional[str])
     out_path = _AUDIO_DIR / f"{audio_id}{ext}"
 
     try:
-        result = _client_azure_oai.audio.speech.create(
+        result = client.audio.speech.create(
             model=dep, voice=voice_to_use, input=text, format=fmt_short
         )
     except TypeError:
-        result = _client_azure_oai.audio.speech.create(
+        result = client.audio.speech.create(
             model=dep, voice=voice_to_use, input=text, response_format=fmt_short
         )
 
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from typing import List, Tuple, Any, Dict
 
-from fastapi import APIRouter, UploadFile, File, BackgroundTasks, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException
 
 from app.schemas.api import UploadFreshResponse
 from app.services.ingest import (
@@ -40,22 +40,22 @@ def _normalize_upload_result(res: Any) -> UploadFreshResponse:
     if not doc_id:
         raise HTTPException(status_code=500, detail="Upload handler returned no doc id.")
 
-    return UploadFreshResponse(jobIds=job_ids, docId=str(doc_id))
+    duplicate = bool(res.get("duplicate")) if isinstance(res, dict) else False
+    batch_id = res.get("batchId") if isinstance(res, dict) else None
+    return UploadFreshResponse(jobIds=job_ids, docId=str(doc_id), duplicate=duplicate, batchId=batch_id)
 
 
 @router.post("/upload/fresh", response_model=UploadFreshResponse)
 async def upload_fresh(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
 ):
     _assert_pdf(file.filename)
-    raw = await handle_upload(file, background_tasks)
+    raw = await handle_upload(file)
     return _normalize_upload_result(raw)
 
 
 @router.post("/upload/bulk", response_model=List[UploadFreshResponse])
 async def upload_bulk(
-    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
 ):
     if not files:
@@ -63,17 +63,16 @@ async def upload_bulk(
     for f in files:
         _assert_pdf(f.filename)
 
-    raw_list = await handle_upload_many(files, background_tasks)
+    raw_list = await handle_upload_many(files)
     return [_normalize_upload_result(r) for r in raw_list]
 
 
 @router.post("/upload/zip", response_model=List[UploadFreshResponse])
 async def upload_zip(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
 ):
 
     if not file.filename.lower().endswith(".zip"):
         raise HTTPException(status_code=400, detail="Please upload a .zip file.")
-    raw_list = await handle_upload_zip(file, background_tasks)
+    raw_list = await handle_upload_zip(file)
     return [_normalize_upload_result(r) for r in raw_list]
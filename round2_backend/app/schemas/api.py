@@ -6,6 +6,8 @@ from pydantic import BaseModel
 class UploadFreshResponse(BaseModel):
     jobIds: List[str]
     docId: str
+    duplicate: bool = False
+    batchId: Optional[str] = None
 
 class UploadedFileInfo(BaseModel):
     filename: str
@@ -32,6 +34,18 @@ class StatusResponse(BaseModel):
     jobs: List[JobStatus]
 
 
+class BatchStatusRequest(BaseModel):
+    jobIds: List[str]
+
+class BatchStatusResponse(BaseModel):
+    batchId: Optional[str] = None
+    total: int
+    counts: Dict[str, int]
+    progress: int
+    finished: bool
+    jobs: List[Dict[str, Any]]
+
+
 class RelatedRequest(BaseModel):
     query: str
     k: int = 5
@@ -0,0 +1,150 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+import os
+import time
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import faiss
+    from app.services.vector_store import SegmentSet
+
+# auto picks per segment size, so small fresh segments stay exact and compaction upgrades big ones;
+# flat|hnsw|ivfpq forces one kind wherever it can be built
+INDEX_TYPE = os.getenv("INDEX_TYPE", "auto").lower()
+INDEX_HNSW_MIN = int(os.getenv("INDEX_HNSW_MIN", "50000"))
+INDEX_IVFPQ_MIN = int(os.getenv("INDEX_IVFPQ_MIN", "1000000"))
+HNSW_M = int(os.getenv("INDEX_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("INDEX_HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("INDEX_HNSW_EF_SEARCH", "64"))
+IVF_NPROBE = int(os.getenv("INDEX_IVF_NPROBE", "16"))
+PQ_M = int(os.getenv("INDEX_PQ_M", "48"))
+# vector storage inside flat/HNSW segments: fp32 (exact), fp16 (2x smaller) or sq8 (4x smaller)
+INDEX_STORAGE = os.getenv("INDEX_STORAGE", "fp32").lower()
+# re-rank candidates from lossy segments with their archived vectors, fetching this many times topk
+INDEX_RESCORE = os.getenv("INDEX_RESCORE", "1") == "1"
+RESCORE_OVERFETCH = max(1, int(os.getenv("INDEX_RESCORE_OVERFETCH", "2")))
+
+KINDS = ("flat", "hnsw", "ivfpq")
+STORAGES = ("fp32", "fp16", "sq8")
+_SQ = {"fp16": "SQfp16", "sq8": "SQ8"}
+
+
+def _nlist(n: int) -> int:
+    return int(min(65536, max(16, 4 * np.sqrt(n))))
+
+def _trainable(n: int) -> bool:
+    # faiss wants ~39 training points per centroid
+    return n >= 39 * _nlist(n)
+
+def choose(n: int, kind: Optional[str] = None) -> str:
+    kind = kind or INDEX_TYPE
+    if kind == "auto":
+        kind = "ivfpq" if n >= INDEX_IVFPQ_MIN else "hnsw" if n >= INDEX_HNSW_MIN else "flat"
+    if kind not in KINDS:
+        raise ValueError(f"unknown INDEX_TYPE {kind!r}; expected auto, flat, hnsw or ivfpq")
+    if kind == "ivfpq" and not _trainable(n):
+        kind = "hnsw" if n >= INDEX_HNSW_MIN else "flat"
+    return kind
+
+def layout(n: int) -> Tuple[str, str]:
+    """(kind, storage) a segment of n vectors should be built with under the current settings."""
+    if INDEX_STORAGE not in STORAGES:
+        raise ValueError(f"unknown INDEX_STORAGE {INDEX_STORAGE!r}; expected fp32, fp16 or sq8")
+    kind = choose(n)
+    return kind, "pq" if kind == "ivfpq" else INDEX_STORAGE
+
+def is_lossy(kind: str, storage: str) -> bool:
+    return kind == "ivfpq" or storage != "fp32"
+
+def archive_dtype() -> str:
+    return "float32" if INDEX_STORAGE == "fp32" else "float16"
+
+def build(vectors: np.ndarray, kind: str, dim: int, storage: str = "fp32") -> "faiss.Index":
+    import faiss
+    n = int(vectors.shape[0])
+    if n == 0:
+        # an alias-only segment (every sentence already indexed); quantizers cannot train on nothing
+        return faiss.IndexFlatIP(dim)
+    if kind == "hnsw":
+        if storage in _SQ:
+            index = faiss.index_factory(dim, f"HNSW{HNSW_M},{_SQ[storage]}", faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+        else:
+            index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif kind == "ivfpq":
+        nlist = _nlist(n)
+        m = max(d for d in range(1, min(PQ_M, dim) + 1) if dim % d == 0)
+        index = faiss.index_factory(dim, f"IVF{nlist},PQ{m}", faiss.METRIC_INNER_PRODUCT)
+        # a bounded sample keeps rebuilds of multi-million segments tractable
+        take = min(n, 256 * nlist)
+        sample = vectors if take == n else vectors[np.random.default_rng(0).choice(n, take, replace=False)]
+        index.train(np.ascontiguousarray(sample))
+        index.nprobe = IVF_NPROBE
+    elif storage in _SQ:
+        index = faiss.index_factory(dim, _SQ[storage], faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+    else:
+        index = faiss.IndexFlatIP(dim)
+    index.add(vectors)
+    return index
+
+def kind_of(index: "faiss.Index") -> str:
+    import faiss
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if faiss.try_extract_index_ivf(index) is not None:
+        return "ivfpq"
+    return "flat"
+
+def search_params(kind: str, ef_search: Optional[int] = None, nprobe: Optional[int] = None) -> Any:
+    # per-call parameters; mutating index.hnsw.efSearch would race between request threads
+    import faiss
+    if kind == "hnsw" and ef_search:
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search))
+    if kind == "ivfpq" and nprobe:
+        return faiss.SearchParametersIVF(nprobe=int(nprobe))
+    return None
+
+
+def measure_recall(snap: "SegmentSet", queries: Optional[np.ndarray] = None, n_queries: int = 200,
+                   k: int = 10, ef_search: Optional[int] = None, nprobe: Optional[int] = None,
+                   seed: int = 0) -> Dict[str, Any]:
+    """recall@k of the live segments against an exact flat scan over the same vectors."""
+    import faiss
+    vecs = np.vstack([s.vectors() for s in snap.segments]).astype("float32")
+    ids = np.concatenate([s.vec_ids() for s in snap.segments])
+    exact = faiss.IndexIDMap(faiss.IndexFlatIP(vecs.shape[1]))
+    exact.add_with_ids(vecs, ids)
+    if queries is None:
+        # stored sentences plus noise: close to real queries without being exact self-matches
+        rng = np.random.default_rng(seed)
+        q = vecs[rng.choice(len(vecs), min(n_queries, len(vecs)), replace=False)]
+        q = q + rng.normal(scale=0.05, size=q.shape).astype("float32")
+    else:
+        q = np.asarray(queries, dtype="float32")
+    q = np.ascontiguousarray(q)
+    faiss.normalize_L2(q)
+    t0 = time.perf_counter()
+    _, truth = exact.search(q, k)
+    exact_s = time.perf_counter() - t0
+    hits: List[float] = []
+    t0 = time.perf_counter()
+    for i in range(len(q)):
+        got = {r["vecId"] for _, r in snap.search(q[i:i + 1], k, ef_search=ef_search, nprobe=nprobe)}
+        want = {int(x) for x in truth[i] if x >= 0}
+        hits.append(len(got & want) / max(1, len(want)))
+    ann_s = time.perf_counter() - t0
+    kinds: Dict[str, int] = {}
+    for s in snap.segments:
+        kinds[s.kind] = kinds.get(s.kind, 0) + s.ntotal
+    return {
+        "vectors": int(len(vecs)), "queries": int(len(q)), "k": k,
+        "efSearch": ef_search or HNSW_EF_SEARCH, "nprobe": nprobe or IVF_NPROBE,
+        "vectorsByKind": kinds, "storage": INDEX_STORAGE, "rescore": INDEX_RESCORE,
+        "recallAtK": round(float(np.mean(hits)) if hits else 0.0, 4),
+        "msPerQueryAnn": round(1000 * ann_s / max(1, len(q)), 3),
+        "msPerQueryExact": round(1000 * exact_s / max(1, len(q)), 3),
+    }
@@ -61,6 +61,8 @@ def smart_answer(
     narrate: bool = False,
     voice: Optional[str] = None,
     format: Optional[str] = None,
+    ef_search: Optional[int] = None,
+    nprobe: Optional[int] = None,
 ) -> Dict[str, Any]:
    
     hits = related_search(
@@ -70,6 +72,8 @@ def smart_answer(
         persona=persona,
         task=task,
         deep=deep,
+        ef_search=ef_search,
+        nprobe=nprobe,
     )
 
     answer_text = _build_answer_from_sources(hits, max_chars=900)
@@ -0,0 +1,61 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Optional
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from app.utils.atomic import atomic_save_npy, atomic_write_text
+from app.utils.config import DATA_DIR
+
+CACHE_DIR = DATA_DIR / "cache"
+ENABLED = os.getenv("ARTIFACT_CACHE", "1").lower() not in ("0", "false", "no")
+
+PAGES_DIR = CACHE_DIR / "pages"
+
+def file_sha256(path: Path, chunk: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        while True:
+            buf = f.read(chunk)
+            if not buf:
+                break
+            h.update(buf)
+    return h.hexdigest()
+
+def _path(kind: str, key: str, ext: str) -> Path:
+    return CACHE_DIR / kind / key[:2] / f"{key}{ext}"
+
+def load_json(kind: str, key: str) -> Optional[Any]:
+    p = _path(kind, key, ".json")
+    if not ENABLED or not p.exists():
+        return None
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+def save_json(kind: str, key: str, obj: Any) -> None:
+    if not ENABLED:
+        return
+    p = _path(kind, key, ".json")
+    p.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_text(p, json.dumps(obj, ensure_ascii=False))
+
+def load_array(kind: str, key: str) -> Optional[np.ndarray]:
+    p = _path(kind, key, ".npy")
+    if not ENABLED or not p.exists():
+        return None
+    try:
+        return np.load(p)
+    except (OSError, ValueError):
+        return None
+
+def save_array(kind: str, key: str, arr: np.ndarray) -> None:
+    if not ENABLED:
+        return
+    p = _path(kind, key, ".npy")
+    p.parent.mkdir(parents=True, exist_ok=True)
+    atomic_save_npy(p, arr)
@@ -0,0 +1,74 @@
+from __future__ import annotations
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+import queue
+import threading
+import time
+
+import numpy as np
+
+EncodeFn = Callable[[List[str]], np.ndarray]
+T = TypeVar("T")
+
+
+def drain(q: "queue.Queue[T]", first: T, size: Callable[[T], int], max_size: int, wait_s: float) -> List[T]:
+    """`first` plus whatever arrives within `wait_s` of it, stopping once the batch reaches `max_size`."""
+    batch = [first]
+    n = size(first)
+    deadline = time.monotonic() + wait_s
+    while n < max_size:
+        remaining = deadline - time.monotonic()
+        try:
+            item = q.get(timeout=remaining) if remaining > 0 else q.get_nowait()
+        except queue.Empty:
+            break
+        batch.append(item)
+        n += size(item)
+    return batch
+
+
+class MicroBatcher:
+    """Coalesces concurrent encode calls into one model call.
+
+    The first request of a batch waits at most `max_wait_ms` for company; a
+    batch closes early once `max_batch` texts are queued.
+    """
+
+    def __init__(self, encode_fn: EncodeFn, max_batch: int = 64, max_wait_ms: float = 5.0,
+                 name: str = "embed-batcher"):
+        self.encode_fn = encode_fn
+        self.max_batch = max(1, max_batch)
+        self.wait_s = max(0.0, max_wait_ms) / 1000.0
+        self._q: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._stats = {"batches": 0, "requests": 0, "texts": 0}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: Sequence[str]) -> Future:
+        fut: Future = Future()
+        self._q.put((list(texts), fut))
+        return fut
+
+    def encode(self, texts: Sequence[str], timeout: Optional[float] = None) -> np.ndarray:
+        return self.submit(texts).result(timeout=timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+    def _run(self) -> None:
+        while True:
+            batch = drain(self._q, self._q.get(), lambda item: len(item[0]), self.max_batch, self.wait_s)
+            texts = [t for ts, _ in batch for t in ts]
+            try:
+                vecs = np.asarray(self.encode_fn(texts), dtype="float32") if texts else np.zeros((0, 0), "float32")
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            self._stats["batches"] += 1
+            self._stats["requests"] += len(batch)
+            self._stats["texts"] += len(texts)
+            off = 0
+            for ts, fut in batch:
+                fut.set_result(vecs[off:off + len(ts)])
+                off += len(ts)
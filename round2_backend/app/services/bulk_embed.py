@@ -0,0 +1,151 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from app.services.embeddings import MODEL_NAME, get_model
+
+# padded tokens per forward pass; short sentences get big batches, long ones small
+EMBED_BULK_TOKENS = int(os.getenv("EMBED_BULK_TOKENS", "8192"))
+EMBED_BULK_MAX_BATCH = int(os.getenv("EMBED_BULK_MAX_BATCH", "256"))
+# 0 encodes in the calling process; >0 shares one spawn pool, hosted by the process that owns the
+# ingest scheduler, between concurrent ingest jobs
+EMBED_BULK_WORKERS = int(os.getenv("EMBED_BULK_WORKERS", "0"))
+# 0 splits the cores the ingest workers leave free between the pool's processes
+EMBED_BULK_TORCH_THREADS = int(os.getenv("EMBED_BULK_TORCH_THREADS", "0"))
+
+_stats = {"sentences": 0, "batches": 0, "seconds": 0.0}
+_stats_lock = threading.Lock()
+
+
+_tokenizer: Any = None
+
+def _pool_tokenizer() -> Any:
+    # the pooled path must not load the model in the parent just to measure lengths
+    global _tokenizer
+    if _tokenizer is None:
+        try:
+            from transformers import AutoTokenizer
+            _tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+        except Exception:
+            _tokenizer = False
+    return _tokenizer or None
+
+def token_lengths(tok: Any, texts: List[str], limit: int = 256) -> np.ndarray:
+    if tok is not None:
+        try:
+            ids = tok(texts, add_special_tokens=True, truncation=True, max_length=limit)["input_ids"]
+            return np.fromiter((len(x) for x in ids), dtype=np.int64, count=len(texts))
+        except Exception:
+            pass
+    # remote / ONNX models without a local tokenizer: ~4 characters per wordpiece
+    return np.minimum(np.fromiter((len(t) // 4 + 2 for t in texts), dtype=np.int64, count=len(texts)), limit)
+
+def plan_batches(lengths: np.ndarray, token_budget: int = EMBED_BULK_TOKENS,
+                 max_batch: int = EMBED_BULK_MAX_BATCH) -> List[np.ndarray]:
+    order = np.argsort(lengths, kind="stable")
+    batches: List[np.ndarray] = []
+    start = 0
+    while start < len(order):
+        end = start + 1
+        # sorted ascending, so the newest member sets the padded width of the batch
+        while end < len(order) and end - start < max_batch and \
+                (end - start + 1) * int(lengths[order[end]]) <= token_budget:
+            end += 1
+        batches.append(order[start:end])
+        start = end
+    return batches
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_reserved = 0
+_dim: Optional[int] = None
+
+def reserve_cores(n: int) -> None:
+    """Cores other processes of this tree (ingest workers) keep busy, left out of the pool's share."""
+    global _reserved
+    _reserved = max(0, n)
+
+def torch_threads() -> int:
+    if EMBED_BULK_TORCH_THREADS > 0:
+        return EMBED_BULK_TORCH_THREADS
+    return max(1, ((os.cpu_count() or 2) - _reserved) // max(1, EMBED_BULK_WORKERS))
+
+def _init_encoder(torch_threads: int) -> None:
+    try:
+        import torch
+        torch.set_num_threads(max(1, torch_threads))
+    except Exception:
+        pass
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    vecs = get_model().encode(texts, batch_size=len(texts), normalize_embeddings=True, show_progress_bar=False)
+    return np.asarray(vecs, dtype="float32")
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if EMBED_BULK_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=EMBED_BULK_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_encoder,
+                initargs=(torch_threads(),),
+            )
+        return _pool
+
+def encode_bulk(texts: List[str]) -> np.ndarray:
+    """Normalized embeddings for `texts`, in input order, computed in length-sorted adaptive batches."""
+    if not texts:
+        return np.zeros((0, embedding_dim()), dtype="float32")
+    t0 = time.perf_counter()
+    pool = _get_pool()
+    if pool is None:
+        model = get_model()
+        lengths = token_lengths(getattr(model, "tokenizer", None), texts,
+                                int(getattr(model, "max_seq_length", 0) or 256))
+    else:
+        lengths = token_lengths(_pool_tokenizer(), texts)
+    batches = plan_batches(lengths, EMBED_BULK_TOKENS, EMBED_BULK_MAX_BATCH)
+    if pool is not None:
+        parts = [pool.submit(_encode_batch, [texts[i] for i in idx]) for idx in batches]
+        results = [f.result() for f in parts]
+    else:
+        results = [_encode_batch([texts[i] for i in idx]) for idx in batches]
+    out = np.zeros((len(texts), results[0].shape[1]), dtype="float32")
+    for idx, vecs in zip(batches, results):
+        out[idx] = vecs
+    global _dim
+    _dim = out.shape[1]
+    with _stats_lock:
+        _stats["sentences"] += len(texts)
+        _stats["batches"] += len(batches)
+        _stats["seconds"] += time.perf_counter() - t0
+    return out
+
+def embedding_dim() -> int:
+    """Width of the model's vectors, measured on whichever side (pool or this process) encodes."""
+    if _dim is None:
+        encode_bulk(["."])
+    return _dim
+
+def stats() -> Dict[str, Any]:
+    with _stats_lock:
+        out = dict(_stats)
+    if EMBED_BULK_WORKERS > 0:
+        cores = EMBED_BULK_WORKERS * torch_threads()
+    else:
+        torch = sys.modules.get("torch")
+        cores = torch.get_num_threads() if torch is not None else 1
+    sps = out["sentences"] / out["seconds"] if out["seconds"] else 0.0
+    out.update(sentencesPerSec=round(sps, 1), sentencesPerSecPerCore=round(sps / cores, 1), cores=cores)
+    return out
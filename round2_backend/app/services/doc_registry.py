@@ -0,0 +1,81 @@
+from __future__ import annotations
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Any
+import sqlite3
+import time
+
+from app.utils.config import DATA_DIR
+
+PATH: Path = DATA_DIR / "documents.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    sha256    TEXT PRIMARY KEY,
+    doc_id    TEXT NOT NULL,
+    job_id    TEXT NOT NULL,
+    orig_name TEXT,
+    created   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_doc ON documents(doc_id);
+CREATE TABLE IF NOT EXISTS aliases (
+    doc_id    TEXT NOT NULL,
+    orig_name TEXT NOT NULL,
+    created   REAL NOT NULL,
+    PRIMARY KEY (doc_id, orig_name)
+);
+"""
+
+_ready = False
+
+def _connect() -> sqlite3.Connection:
+    global _ready
+    conn = sqlite3.connect(str(PATH), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if not _ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _ready = True
+    return conn
+
+def lookup(sha256: str) -> Optional[Dict[str, Any]]:
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT * FROM documents WHERE sha256 = ?", (sha256,)).fetchone()
+    return dict(row) if row else None
+
+def doc_ids() -> Set[str]:
+    with closing(_connect()) as conn:
+        return {r["doc_id"] for r in conn.execute("SELECT doc_id FROM documents")}
+
+def claim(sha256: str, doc_id: str, job_id: str, orig_name: Optional[str]) -> Tuple[str, str, bool]:
+    with closing(_connect()) as conn:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO documents (sha256, doc_id, job_id, orig_name, created) VALUES (?, ?, ?, ?, ?)",
+            (sha256, doc_id, job_id, orig_name, time.time()),
+        )
+        if cur.rowcount == 1:
+            return doc_id, job_id, True
+        row = conn.execute("SELECT doc_id, job_id FROM documents WHERE sha256 = ?", (sha256,)).fetchone()
+    return row["doc_id"], row["job_id"], False
+
+def replace(sha256: str, old_doc_id: str, doc_id: str, job_id: str, orig_name: Optional[str]) -> bool:
+    with closing(_connect()) as conn:
+        cur = conn.execute(
+            "UPDATE documents SET doc_id = ?, job_id = ?, orig_name = ?, created = ? WHERE sha256 = ? AND doc_id = ?",
+            (doc_id, job_id, orig_name, time.time(), sha256, old_doc_id),
+        )
+    return cur.rowcount == 1
+
+def add_alias(doc_id: str, orig_name: Optional[str]) -> None:
+    if not orig_name:
+        return
+    with closing(_connect()) as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO aliases (doc_id, orig_name, created) VALUES (?, ?, ?)",
+            (doc_id, orig_name, time.time()),
+        )
+
+def aliases(doc_id: str) -> List[str]:
+    with closing(_connect()) as conn:
+        rows = conn.execute("SELECT orig_name FROM aliases WHERE doc_id = ? ORDER BY created", (doc_id,)).fetchall()
+    return [r["orig_name"] for r in rows]
@@ -0,0 +1,69 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import random
+import time
+
+import numpy as np
+
+from app.utils.config import DATA_DIR
+from app.services.embeddings import load_local_model
+
+
+def sample_corpus(limit: int, seed: int = 0) -> List[str]:
+    texts: List[str] = []
+    for p in sorted((DATA_DIR / "meta").glob("*_sentences.json")):
+        try:
+            texts.extend(s["text"] for s in json.loads(p.read_text(encoding="utf-8")).get("sentences", []))
+        except (OSError, ValueError, KeyError):
+            continue
+    texts = list(dict.fromkeys(t for t in texts if t))
+    random.Random(seed).shuffle(texts)
+    return texts[:limit]
+
+def _encode(model: Any, texts: List[str]) -> Tuple[np.ndarray, float]:
+    t0 = time.perf_counter()
+    vecs = model.encode(texts, normalize_embeddings=True, show_progress_bar=False)
+    return np.asarray(vecs, dtype="float32"), time.perf_counter() - t0
+
+def _topk(q: np.ndarray, c: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(q @ c.T), axis=1)[:, :k]
+
+def _overlap(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean([len(set(x) & set(y)) / len(x) for x, y in zip(a, b)])) if len(a) else 0.0
+
+def compare(candidate: str, sample: int = 2000, queries: int = 200, k: int = 10,
+            query_file: Optional[Path] = None, seed: int = 0) -> Dict[str, Any]:
+    """Retrieval agreement of an embedding backend with the fp32 torch model on indexed sentences."""
+    corpus = sample_corpus(sample, seed)
+    if not corpus:
+        raise RuntimeError(f"no indexed sentences under {DATA_DIR / 'meta'}; ingest some PDFs first")
+    if query_file:
+        qs = [ln.strip() for ln in Path(query_file).read_text(encoding="utf-8").splitlines() if ln.strip()]
+    else:
+        qs = random.Random(seed + 1).sample(corpus, min(queries, len(corpus)))
+    k = min(k, len(corpus))
+
+    ref_model = load_local_model("torch")
+    ref_c, ref_s = _encode(ref_model, corpus)
+    ref_q, _ = _encode(ref_model, qs)
+    cand_model = ref_model if candidate == "torch" else load_local_model(candidate)
+    cand_c, cand_s = _encode(cand_model, corpus)
+    cand_q, _ = _encode(cand_model, qs)
+
+    ref_top = _topk(ref_q, ref_c, k)
+    return {
+        "backend": candidate,
+        "corpus": len(corpus),
+        "queries": len(qs),
+        "k": k,
+        "meanCosineToFp32": float(np.mean(np.sum(ref_c * cand_c, axis=1))),
+        # candidate used for both corpus and queries (index rebuilt with the new backend)
+        "recallAtK": _overlap(ref_top, _topk(cand_q, cand_c, k)),
+        # candidate queries against an index still built with fp32 vectors
+        "recallAtKFp32Index": _overlap(ref_top, _topk(cand_q, ref_c, k)),
+        "fp32SentencesPerSec": round(len(corpus) / ref_s, 1),
+        "candidateSentencesPerSec": round(len(corpus) / cand_s, 1),
+        "speedup": round(ref_s / cand_s, 2),
+    }
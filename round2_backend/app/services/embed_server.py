@@ -0,0 +1,155 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+
+import numpy as np
+
+from app.services.batcher import MicroBatcher
+
+EMBED_SERVER_SOCKET = os.getenv("EMBED_SERVER_SOCKET", "")
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+EMBED_CLIENT_TIMEOUT = float(os.getenv("EMBED_CLIENT_TIMEOUT", "120"))
+
+_LEN = struct.Struct("!I")
+
+
+def _send_frame(sock: socket.socket, data: bytes) -> None:
+    sock.sendall(_LEN.pack(len(data)) + data)
+
+def _recv_exact(sock: socket.socket, n: int) -> Optional[bytes]:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(min(n - len(buf), 1 << 20))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+def _recv_frame(sock: socket.socket) -> Optional[bytes]:
+    head = _recv_exact(sock, _LEN.size)
+    if head is None:
+        return None
+    return _recv_exact(sock, _LEN.unpack(head)[0])
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        # one persistent connection per client thread; requests are length-prefixed JSON
+        while True:
+            frame = _recv_frame(self.request)
+            if frame is None:
+                return
+            try:
+                req = json.loads(frame)
+                if req.get("op") == "ping":
+                    _send_frame(self.request, json.dumps(self.server.info()).encode())
+                    continue
+                vecs = self.server.batcher.encode(req["texts"])
+            except Exception as e:
+                _send_frame(self.request, json.dumps({"error": str(e)}).encode())
+                continue
+            _send_frame(self.request, json.dumps({"shape": list(vecs.shape)}).encode())
+            _send_frame(self.request, np.ascontiguousarray(vecs, dtype="float32").tobytes())
+
+
+class EmbedServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, path: str, model, model_name: str,
+                 max_batch: int = EMBED_MAX_BATCH, max_wait_ms: float = EMBED_MAX_WAIT_MS):
+        Path(path).unlink(missing_ok=True)
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o660)
+        self.model_name = model_name
+        self.batcher = MicroBatcher(
+            lambda texts: model.encode(texts, batch_size=max(32, max_batch), show_progress_bar=False),
+            max_batch=max_batch, max_wait_ms=max_wait_ms, name="embed-server-batcher",
+        )
+
+    def info(self) -> Dict[str, Any]:
+        return {"ok": True, "model": self.model_name, "pid": os.getpid(), **self.batcher.stats()}
+
+
+def serve(path: str = EMBED_SERVER_SOCKET, max_batch: int = EMBED_MAX_BATCH,
+          max_wait_ms: float = EMBED_MAX_WAIT_MS) -> None:
+    from app.services.embeddings import load_local_model, model_version
+    if not path:
+        raise ValueError("no socket path; set EMBED_SERVER_SOCKET or pass one")
+    server = EmbedServer(path, load_local_model(), model_version(), max_batch, max_wait_ms)
+    print(f"[EMBED] Serving {model_version()} on {path} (max_batch={max_batch}, max_wait_ms={max_wait_ms})")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        Path(path).unlink(missing_ok=True)
+
+
+class RemoteModel:
+    """Drop-in for the subset of SentenceTransformer.encode the app uses, backed by the embed server."""
+
+    def __init__(self, path: str, chunk: int = EMBED_MAX_BATCH, timeout: float = EMBED_CLIENT_TIMEOUT):
+        self.path = path
+        self.chunk = max(1, chunk)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conn(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self._local.sock = sock
+        return sock
+
+    def _drop(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def _call(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        for attempt in range(2):
+            try:
+                sock = self._conn()
+                _send_frame(sock, json.dumps(req).encode())
+                head = _recv_frame(sock)
+                if head is None:
+                    raise ConnectionError("embed server closed the connection")
+                resp = json.loads(head)
+                if "shape" in resp:
+                    resp["data"] = _recv_frame(sock)
+                    if resp["data"] is None:
+                        raise ConnectionError("embed server closed the connection")
+                return resp
+            except OSError:
+                # stale connection after a server restart; reconnect once
+                self._drop()
+                if attempt:
+                    raise
+
+    def ping(self) -> Dict[str, Any]:
+        return self._call({"op": "ping"})
+
+    def encode(self, sentences: Union[str, Sequence[str]], normalize_embeddings: bool = False,
+               show_progress_bar: bool = False, **_: Any) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts: List[str] = [sentences] if single else list(sentences)
+        parts = []
+        for i in range(0, len(texts), self.chunk):
+            resp = self._call({"texts": texts[i:i + self.chunk]})
+            if "error" in resp:
+                raise RuntimeError(f"embed server: {resp['error']}")
+            parts.append(np.frombuffer(resp["data"], dtype="float32").reshape(resp["shape"]))
+        vecs = np.vstack(parts) if parts else np.zeros((0, 0), dtype="float32")
+        if normalize_embeddings and vecs.size:
+            vecs = vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+        return vecs[0] if single else vecs
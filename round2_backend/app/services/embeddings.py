@@ -1,11 +1,106 @@
 from __future__ import annotations
-from sentence_transformers import SentenceTransformer
-from typing import Optional
+from pathlib import Path
+from typing import Any, List, Optional
+import os
+import threading
 
-_model: Optional[SentenceTransformer] = None
+import numpy as np
 
-def get_model() -> SentenceTransformer:
+from app.utils.config import DATA_DIR
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# torch: fp32 PyTorch; int8: dynamically quantized Linear layers; onnx: exported graph on onnxruntime
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch").lower()
+EMBED_ONNX_DIR = Path(os.getenv("EMBED_ONNX_DIR", str(DATA_DIR / "models" / "minilm-onnx")))
+
+# query encodes arriving within QUERY_BATCH_WAIT_MS of each other share one forward pass;
+# QUERY_BATCH_MAX=1 turns the batcher off
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "32"))
+QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "3"))
+
+_model: Optional[Any] = None
+_lock = threading.Lock()
+_query_batcher = None
+
+def load_local_model(backend: str = EMBED_BACKEND) -> Any:
+    if backend == "onnx":
+        from app.services.onnx_backend import OnnxEncoder
+        return OnnxEncoder(EMBED_ONNX_DIR)
+    # torch + transformers cost seconds to import; only pay it when something encodes
+    from sentence_transformers import SentenceTransformer
+    if backend == "int8":
+        import torch
+        model = SentenceTransformer(MODEL_NAME, device="cpu")
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if backend != "torch":
+        raise ValueError(f"unknown EMBED_BACKEND {backend!r}; expected torch, int8 or onnx")
+    return SentenceTransformer(MODEL_NAME)
+
+def _connect_server(path: str) -> Optional[Any]:
+    from app.services.embed_server import RemoteModel
+    remote = RemoteModel(path)
+    try:
+        info = remote.ping()
+    except OSError as e:
+        print(f"[EMBED] Server at {path} unreachable ({e}); loading the model in-process")
+        return None
+    if info.get("model") != model_version():
+        print(f"[EMBED] Server at {path} serves {info.get('model')}, expected {model_version()}; loading in-process")
+        return None
+    return remote
+
+def get_model() -> Any:
     global _model
     if _model is None:
-        _model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+        with _lock:
+            if _model is None:
+                from app.services.embed_server import EMBED_SERVER_SOCKET
+                remote = _connect_server(EMBED_SERVER_SOCKET) if EMBED_SERVER_SOCKET else None
+                _model = remote or load_local_model()
     return _model
+
+def _encode_normalized(texts: List[str]) -> np.ndarray:
+    return get_model().encode(texts, normalize_embeddings=True, show_progress_bar=False)
+
+def _get_query_batcher():
+    global _query_batcher
+    if _query_batcher is None:
+        with _lock:
+            if _query_batcher is None:
+                from app.services.batcher import MicroBatcher
+                _query_batcher = MicroBatcher(_encode_normalized, max_batch=QUERY_BATCH_MAX,
+                                              max_wait_ms=QUERY_BATCH_WAIT_MS, name="query-batcher")
+    return _query_batcher
+
+def model_version() -> str:
+    return MODEL_NAME if EMBED_BACKEND == "torch" else f"{MODEL_NAME}@{EMBED_BACKEND}"
+
+def _encode_uncached(queries: List[str]) -> np.ndarray:
+    if QUERY_BATCH_MAX <= 1:
+        vecs = _encode_normalized(list(queries))
+    else:
+        vecs = _get_query_batcher().encode(queries)
+    return np.asarray(vecs, dtype="float32").reshape(len(queries), -1)
+
+def encode_queries(queries: List[str]) -> np.ndarray:
+    from app.services.query_cache import query_cache
+    version = model_version()
+    keys = [query_cache.key(q, version) for q in queries]
+    found = [query_cache.get(k) for k in keys]
+    todo = [i for i, v in enumerate(found) if v is None]
+    if todo:
+        fresh = _encode_uncached([queries[i] for i in todo])
+        for i, vec in zip(todo, fresh):
+            query_cache.put(keys[i], vec)
+            found[i] = vec
+    return np.vstack(found).astype("float32", copy=False)
+
+def embed_stats() -> dict:
+    from app.services.query_cache import query_cache
+    from app.services import bulk_embed
+    return {
+        "cache": query_cache.stats(),
+        "batcher": _query_batcher.stats() if _query_batcher is not None else {},
+        "bulk": bulk_embed.stats(),
+    }
@@ -0,0 +1,64 @@
+from __future__ import annotations
+from concurrent.futures import Future
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+import os
+import queue
+import threading
+
+import numpy as np
+
+from app.utils.config import DATA_DIR
+from app.services.batcher import drain
+from app.services.vector_store import VectorStore
+
+FLUSH_MS = int(os.getenv("INDEX_FLUSH_MS", "200"))
+FLUSH_ROWS = int(os.getenv("INDEX_FLUSH_ROWS", "20000"))
+
+
+class IndexWriter:
+    def __init__(self, index_dir: Path, flush_ms: int = FLUSH_MS, flush_rows: int = FLUSH_ROWS):
+        self.store = VectorStore(index_dir)
+        self.flush_s = max(0, flush_ms) / 1000.0
+        self.flush_rows = max(1, flush_rows)
+        self._q: "queue.Queue[Tuple[np.ndarray, List[Dict[str, Any]], Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="index-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, vectors: np.ndarray, mapping_rows: List[Dict[str, Any]]) -> Future:
+        if len(vectors) != len(mapping_rows):
+            raise ValueError(f"{len(vectors)} vectors for {len(mapping_rows)} mapping rows")
+        fut: Future = Future()
+        if vectors.size == 0:
+            fut.set_result(0)
+            return fut
+        self._q.put((vectors, mapping_rows, fut))
+        return fut
+
+    def add(self, vectors: np.ndarray, mapping_rows: List[Dict[str, Any]], timeout: Optional[float] = None) -> int:
+        return self.submit(vectors, mapping_rows).result(timeout=timeout)
+
+    def _run(self) -> None:
+        while True:
+            batch = drain(self._q, self._q.get(), lambda item: len(item[1]), self.flush_rows, self.flush_s)
+            try:
+                vectors = np.vstack([np.asarray(v, dtype="float32") for v, _, _ in batch])
+                rows = [r for _, rs, _ in batch for r in rs]
+                self.store.add(vectors, rows)
+            except Exception as e:
+                for _, _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for v, _, fut in batch:
+                fut.set_result(int(v.shape[0]))
+
+
+_writer: Optional[IndexWriter] = None
+_writer_lock = threading.Lock()
+
+def get_writer() -> IndexWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = IndexWriter(DATA_DIR / "index")
+        return _writer
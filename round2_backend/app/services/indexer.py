@@ -1,16 +1,18 @@
 from __future__ import annotations
 from pathlib import Path
-from typing import Callable, List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional, Tuple
 import json
 import numpy as np
 import re
-import fitz  
 
+from app.utils.atomic import atomic_save_npy, atomic_write_text
 from app.utils.config import DATA_DIR
-from app.services.vector_store import VectorStore
-from app.services.embeddings import get_model
-
-from app.engines.r1a.sectionizer import sectionize
+from app.services.index_writer import get_writer
+from app.services.embeddings import model_version
+from app.services.bulk_embed import encode_bulk
+from app.services.job_store import stage_index
+from app.services import ann, artifact_cache, sentence_cache
+from app.services.vector_store import INDEX_DEDUP_SENTENCES
 
 def _split_sentences(text: str) -> List[str]:
     text = re.sub(r"\s+", " ", text.strip())
@@ -19,6 +21,7 @@ def _split_sentences(text: str) -> List[str]:
     return parts[:400]
 
 def _fallback_page_sections(pdf_path: Path) -> Dict[str, Any]:
+    import fitz
     doc = fitz.open(pdf_path)
     title = (doc.metadata or {}).get("title") or pdf_path.stem
     sections = []
@@ -37,66 +40,114 @@ def _fallback_page_sections(pdf_path: Path) -> Dict[str, Any]:
     doc.close()
     return {"title": title, "sections": sections}
 
-def index_document(
+def _save_vecs(path: Path, vecs: np.ndarray) -> None:
+    # compressed deployments archive fp16; everything reading these widens back to fp32
+    atomic_save_npy(path, vecs.astype(ann.archive_dtype(), copy=False))
+
+def _embed_sentences(texts: List[str], keys: List[str]) -> np.ndarray:
+    # boilerplate repeats across documents: encode each distinct sentence once, ever
+    found = sentence_cache.get_many(list(dict.fromkeys(keys)))
+    todo = list(dict.fromkeys(k for k in keys if k not in found))
+    if todo:
+        first = {k: i for i, k in reversed(list(enumerate(keys)))}
+        fresh = encode_bulk([texts[first[k]] for k in todo])
+        sentence_cache.put_many(zip(todo, fresh))
+        found.update(zip(todo, fresh))
+    return np.vstack([found[k] for k in keys]).astype("float32", copy=False)
+
+def prepare_document(
     doc_id: str,
     pdf_path: Path,
     job_id: str,
     progress_cb: Callable[[str, dict], None] | None = None,
-    orig_name: str | None = None
-) -> None:
-
-    try:
-        sec_pack = sectionize(pdf_path)
-    except Exception as _:
-        sec_pack = {"title": "", "sections": []}
-
-    if not sec_pack.get("sections"):
-        sec_pack = _fallback_page_sections(pdf_path)
-
-    title = sec_pack.get("title") or pdf_path.stem
-    sections = sec_pack["sections"]
-
-    (DATA_DIR / "meta" / f"{doc_id}_sections.json").write_text(json.dumps({
-        "docId": doc_id,
-        "title": title,
-        "origName": orig_name or Path(pdf_path).name,
-        "sections": sections
-    }, ensure_ascii=False))
-
-    if progress_cb:
-        progress_cb(job_id, {"jobId": job_id, "docId": doc_id, "status": "running", "progress": 35})
-
-    sent_records: List[tuple] = []  
-    for s in sections:
-        sents = _split_sentences(s.get("text", ""))
-        for idx, sent in enumerate(sents):
-            sent_records.append((s["sectionId"], int(s.get("page", 1)), float(s.get("y", 0.0)), sent))
-
-    (DATA_DIR / "meta" / f"{doc_id}_sentences.json").write_text(json.dumps(
-        {"docId": doc_id,
-         "sentences": [
-             {"sentId": f"s{i}", "sectionId": sid, "page": page, "y": y, "text": sent}
-             for i, (sid, page, y, sent) in enumerate(sent_records)
-         ]
+    orig_name: str | None = None,
+    resume_stage: str | None = None,
+    embed: bool = True,
+) -> Tuple[Optional[np.ndarray], List[Dict[str, Any]]]:
+    """Vectors and row metadata for one document; with embed=False, (None, []) once vectors are all that is missing."""
+    from app.engines.r1a.sectionizer import sectionize, ENGINE_VERSION
+    done = stage_index(resume_stage)
+    sec_path = DATA_DIR / "meta" / f"{doc_id}_sections.json"
+    sent_path = DATA_DIR / "meta" / f"{doc_id}_sentences.json"
+    vec_path = DATA_DIR / "vecs" / f"{doc_id}.npy"
+
+    def report(progress: int, stage: str) -> None:
+        if progress_cb:
+            progress_cb(job_id, {"jobId": job_id, "docId": doc_id, "status": "running",
+                                 "progress": progress, "stage": stage})
+
+    if done >= stage_index("sectioned") and sec_path.exists():
+        sec_pack = json.loads(sec_path.read_text())
+        title = sec_pack.get("title") or pdf_path.stem
+        sections = sec_pack["sections"]
+        orig_name = orig_name or sec_pack.get("origName")
+    else:
+        doc_key = f"{artifact_cache.file_sha256(pdf_path)}-{ENGINE_VERSION}" if artifact_cache.ENABLED else None
+        sec_pack = artifact_cache.load_json("sections", doc_key) if doc_key else None
+        if not sec_pack:
+            try:
+                sec_pack = sectionize(pdf_path, cache_dir=artifact_cache.PAGES_DIR if doc_key else None)
+            except Exception as _:
+                sec_pack = {"title": "", "sections": []}
+
+            if not sec_pack.get("sections"):
+                sec_pack = _fallback_page_sections(pdf_path)
+
+            if doc_key:
+                # a title that is just this upload's file stem must not leak into other uploads
+                cached_title = sec_pack.get("title") if sec_pack.get("title") != pdf_path.stem else ""
+                artifact_cache.save_json("sections", doc_key, {"title": cached_title, "sections": sec_pack["sections"]})
+
+        title = sec_pack.get("title") or pdf_path.stem
+        sections = sec_pack["sections"]
+
+        atomic_write_text(sec_path, json.dumps({
+            "docId": doc_id,
+            "title": title,
+            "origName": orig_name or Path(pdf_path).name,
+            "sections": sections
         }, ensure_ascii=False))
 
-    if progress_cb:
-        progress_cb(job_id, {"jobId": job_id, "docId": doc_id, "status": "running", "progress": 60})
+    report(35, "sectioned")
 
-    if sent_records:
-        model = get_model()
-        texts = [x[3] for x in sent_records]
-        vecs = model.encode(texts, normalize_embeddings=True, show_progress_bar=False)
-        vecs = np.asarray(vecs, dtype="float32")
+    sent_records: List[tuple] = []  
+    if done >= stage_index("sentences") and sent_path.exists():
+        for r in json.loads(sent_path.read_text()).get("sentences", []):
+            sent_records.append((r["sectionId"], int(r["page"]), float(r["y"]), r["text"]))
     else:
-        vecs = np.zeros((0, 384), dtype="float32")
-    np.save(DATA_DIR / "vecs" / f"{doc_id}.npy", vecs)
-
-    if progress_cb:
-        progress_cb(job_id, {"jobId": job_id, "docId": doc_id, "status": "running", "progress": 80})
-
+        for s in sections:
+            sents = _split_sentences(s.get("text", ""))
+            for idx, sent in enumerate(sents):
+                sent_records.append((s["sectionId"], int(s.get("page", 1)), float(s.get("y", 0.0)), sent))
+
+        atomic_write_text(sent_path, json.dumps(
+            {"docId": doc_id,
+             "sentences": [
+                 {"sentId": f"s{i}", "sectionId": sid, "page": page, "y": y, "text": sent}
+                 for i, (sid, page, y, sent) in enumerate(sent_records)
+             ]
+            }, ensure_ascii=False))
+
+    report(60, "sentences")
+
+    sent_keys = [sentence_cache.sentence_key(x[3], model_version()) for x in sent_records]
+    vecs = None
+    if done >= stage_index("embedded") and vec_path.exists():
+        vecs = np.load(vec_path).astype("float32", copy=False)
+        if vecs.shape[0] != len(sent_records):
+            vecs = None
+    if vecs is None:
+        if not embed:
+            return None, []
+        if sent_records:
+            # a re-upload of the same text is served sentence by sentence from the sentence cache
+            vecs = _embed_sentences([x[3] for x in sent_records], sent_keys)
+        else:
+            vecs = encode_bulk([])
+        _save_vecs(vec_path, vecs)
+
+    report(80, "embedded")
 
-    store = VectorStore(DATA_DIR / "index")
     title_by_section = {s["sectionId"]: s.get("title", "") for s in sections}
 
     mapping = []
@@ -111,7 +162,21 @@ def index_document(
             "page": page,
             "y": y,
         })
-    store.add(vecs, mapping)
+        if INDEX_DEDUP_SENTENCES:
+            mapping[-1]["h"] = sent_keys[i]
+    return vecs, mapping
+
+def index_document(
+    doc_id: str,
+    pdf_path: Path,
+    job_id: str,
+    progress_cb: Callable[[str, dict], None] | None = None,
+    orig_name: str | None = None,
+    resume_stage: str | None = None,
+) -> None:
+    vecs, mapping = prepare_document(doc_id, pdf_path, job_id, progress_cb=progress_cb,
+                                     orig_name=orig_name, resume_stage=resume_stage)
+    get_writer().add(vecs, mapping)
 
     if progress_cb:
-        progress_cb(job_id, {"jobId": job_id, "docId": doc_id, "status": "running", "progress": 95})
+        progress_cb(job_id, {"jobId": job_id, "docId": doc_id, "status": "running", "progress": 95, "stage": "indexed"})
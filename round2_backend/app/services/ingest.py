@@ -1,81 +1,280 @@
 from __future__ import annotations
-from fastapi import UploadFile, BackgroundTasks
+from fastapi import UploadFile, HTTPException
 from pathlib import Path
 from uuid import uuid4
 import json
 import zipfile
 import shutil
-from typing import List, Set, Tuple
-import fitz 
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Optional
 
-from app.utils.config import DATA_DIR, MAX_PDFS_PER_ZIP
-from app.services.indexer import index_document  
+from app.utils.config import DATA_DIR, MAX_PDFS_PER_ZIP, MAX_UPLOAD_BYTES
+from app.services import job_store, doc_registry, jobs
+from app.services.artifact_cache import file_sha256
+from app.services.spool import Spooled, SpoolTooLarge, spool_upload, spool_member
+from app.services.scheduler import (
+    IngestScheduler,
+    SchedulerFull,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_BULK,
+    PRIORITY_BATCH,
+)
 
 
-def _write_bytes(path: Path, data: bytes) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("wb") as f:
-        f.write(data)
+ZIP_WORKERS = int(os.getenv("ZIP_WORKERS", str(min(8, os.cpu_count() or 2))))
+
 
 def _write_job(job_id: str, payload: dict) -> None:
-    (DATA_DIR / "tmp" / f"{job_id}.json").write_text(json.dumps(payload))
+    jobs.record(job_id, payload)
 
-def _is_probably_pdf(data: bytes) -> bool:
-    if not data or len(data) < 5:
-        return False
-    if data[:4] == b"%PDF":
-        return True
-    try:
-        doc = fitz.open(stream=data, filetype="pdf")
-        doc.close()
-        return True
-    except Exception:
-        return False
 
+_scheduler: Optional[IngestScheduler] = None
+_zip_pool: Optional[ThreadPoolExecutor] = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> IngestScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = IngestScheduler(on_progress=_write_job)
+        return _scheduler
+
+def shutdown_scheduler() -> None:
+    global _scheduler, _zip_pool
+    with _scheduler_lock:
+        if _zip_pool is not None:
+            _zip_pool.shutdown(wait=False, cancel_futures=True)
+            _zip_pool = None
+        if _scheduler is not None:
+            _scheduler.shutdown()
+            _scheduler = None
+
+def _admit(n: int = 1) -> None:
+    if not get_scheduler().has_capacity(n):
+        raise HTTPException(status_code=503, detail="Ingest queue is full. Retry later.",
+                            headers={"Retry-After": "30"})
 
-def kickoff_indexing(doc_id: str, pdf_path: Path, job_id: str, orig_name: str | None = None) -> None:
-    _write_job(job_id, {"jobId": job_id, "docId": doc_id, "status": "running", "progress": 5})
+def kickoff_indexing(doc_id: str, pdf_path: Path, job_id: str, orig_name: str | None = None,
+                     priority: int = PRIORITY_BULK, stage: str | None = None) -> None:
+    if stage is None:
+        job_store.create(job_id, doc_id, pdf_path, orig_name, priority)
+    _write_job(job_id, {"jobId": job_id, "docId": doc_id, "status": "queued", "progress": 0})
     try:
-        index_document(doc_id, pdf_path, job_id, progress_cb=_write_job, orig_name=orig_name)
-        _write_job(job_id, {"jobId": job_id, "docId": doc_id, "status": "done", "progress": 100})
-    except Exception as e:
+        get_scheduler().submit(job_id, doc_id, pdf_path, orig_name, priority=priority, stage=stage)
+    except SchedulerFull as e:
         _write_job(job_id, {"jobId": job_id, "docId": doc_id, "status": "error", "error": str(e), "progress": 0})
 
+def _dedupe(sha256: str, doc_id: str, job_id: str, orig_name: str | None, pdf_path: Path,
+            priority: int, keep_job: bool = False) -> Optional[dict]:
+    """Claim the content hash for this upload; None means it is new and its job row is queued.
+
+    A duplicate's own job is deleted, or with keep_job (its id is already out) redirected to the original.
+    """
+    # the job row exists before the claim, so a concurrent upload of the same bytes never
+    # mistakes a claim whose row is not written yet for a failed job
+    job_store.create(job_id, doc_id, pdf_path, orig_name, priority)
+    while True:
+        known_doc, known_job, fresh = doc_registry.claim(sha256, doc_id, job_id, orig_name)
+        if fresh:
+            return None
+        prev = job_store.get(known_job)
+        if prev is None or prev["status"] != "error":
+            break
+        # the earlier copy never made it into the index; let this upload take its place
+        if doc_registry.replace(sha256, known_doc, doc_id, job_id, orig_name):
+            return None
+    if keep_job:
+        job_store.redirect(job_id, known_doc, known_job)
+    else:
+        job_store.delete(job_id)
+    doc_registry.add_alias(known_doc, orig_name)
+    return {"jobId": known_job, "docId": known_doc, "duplicate": True}
+
+def backfill_registry() -> int:
+    """Hash PDFs indexed before the registry knew them, so re-uploading one is caught as a duplicate."""
+    known = doc_registry.doc_ids()
+    added = 0
+    for pdf in sorted((DATA_DIR / "docs").glob("*.pdf")):
+        doc_id = pdf.stem
+        sec_path = DATA_DIR / "meta" / f"{doc_id}_sections.json"
+        if doc_id in known or not (DATA_DIR / "meta" / f"{doc_id}_sentences.json").exists():
+            continue
+        job = job_store.latest_for_doc(doc_id)
+        if job is not None and job["status"] != "done":
+            # still being ingested (it claims its own hash) or failed (not in the index)
+            continue
+        try:
+            orig_name = json.loads(sec_path.read_text(encoding="utf-8")).get("origName") if sec_path.exists() else None
+            sha256 = file_sha256(pdf)
+        except (OSError, ValueError):
+            continue
+        made = job is None
+        if made:
+            # indexed before jobs were persisted; give duplicates of it a job id that reports done
+            job = {"job_id": uuid4().hex[:12]}
+            job_store.create(job["job_id"], doc_id, pdf, orig_name, PRIORITY_BULK)
+            job_store.update(job["job_id"], {"status": "done", "progress": 100, "stage": "indexed"})
+        known_doc, _, fresh = doc_registry.claim(sha256, doc_id, job["job_id"], orig_name)
+        if fresh:
+            added += 1
+            continue
+        # an identical file indexed under another docId, or another worker got here first
+        if made:
+            job_store.delete(job["job_id"])
+        if known_doc != doc_id:
+            doc_registry.add_alias(known_doc, orig_name)
+    return added
+
+def resume_pending() -> int:
+    resumed = 0
+    by_zip: Dict[str, List[Tuple[str, str, str]]] = {}
+    for job in job_store.claim_unfinished():
+        if job["source"]:
+            # a zip member that was never extracted; the archive is still in its tmp dir
+            zip_path, member = json.loads(job["source"])
+            by_zip.setdefault(zip_path, []).append((member, job["doc_id"], job["job_id"]))
+            continue
+        pdf_path = Path(job["pdf_path"])
+        if not pdf_path.exists():
+            _write_job(job["job_id"], {"jobId": job["job_id"], "docId": job["doc_id"], "status": "error",
+                                       "error": "source PDF is missing", "progress": 0})
+            continue
+        kickoff_indexing(job["doc_id"], pdf_path, job["job_id"], job["orig_name"],
+                         priority=job["priority"], stage=job["stage"])
+        resumed += 1
+    for zip_path, planned in by_zip.items():
+        if not Path(zip_path).exists():
+            for _, doc_id, job_id in planned:
+                _write_job(job_id, {"jobId": job_id, "docId": doc_id, "status": "error",
+                                    "error": "source archive is missing", "progress": 0})
+            continue
+        _expand_zip(Path(zip_path).parent, Path(zip_path), planned)
+        resumed += len(planned)
+    return resumed
+
 
-async def handle_upload(file: UploadFile, background_tasks: BackgroundTasks) -> dict:
-    content = await file.read()
+async def _spool_pdf(file: UploadFile) -> Tuple[str, Path, Spooled]:
     doc_id = uuid4().hex[:12]
-    job_id = uuid4().hex[:12]
     dest = DATA_DIR / "docs" / f"{doc_id}.pdf"
-    _write_bytes(dest, content)
+    try:
+        sp = await spool_upload(file, dest, limit=MAX_UPLOAD_BYTES)
+    except SpoolTooLarge as e:
+        raise HTTPException(status_code=413, detail=f"{file.filename} {e}.")
+    finally:
+        await file.close()
+    if not sp.has_pdf_magic:
+        dest.unlink(missing_ok=True)
+        raise HTTPException(status_code=400, detail=f"Not a PDF file: {file.filename}")
+    return doc_id, dest, sp
 
-    _write_job(job_id, {"jobId": job_id, "docId": doc_id, "status": "queued", "progress": 0})
-    background_tasks.add_task(kickoff_indexing, doc_id, dest, job_id, file.filename)
+def _start(doc_id: str, dest: Path, sp: Spooled, orig_name: str | None, priority: int) -> dict:
+    job_id = uuid4().hex[:12]
+    dup = _dedupe(sp.sha256, doc_id, job_id, orig_name, dest, priority)
+    if dup:
+        dest.unlink(missing_ok=True)
+        return dup
+
+    kickoff_indexing(doc_id, dest, job_id, orig_name, priority=priority, stage="queued")
     return {"jobId": job_id, "docId": doc_id}
 
-async def handle_upload_many(files: List[UploadFile], background_tasks: BackgroundTasks) -> List[dict]:
-    results: List[dict] = []
-    for f in files:
-        res = await handle_upload(f, background_tasks)
-        results.append(res)
+async def handle_upload(file: UploadFile, priority: int = PRIORITY_INTERACTIVE) -> dict:
+    _admit()
+    doc_id, dest, sp = await _spool_pdf(file)
+    return _start(doc_id, dest, sp, file.filename, priority)
+
+async def handle_upload_many(files: List[UploadFile]) -> List[dict]:
+    _admit(len(files))
+    # every file is checked before any is queued, so a bad one fails the request without orphaning jobs
+    spooled: List[Tuple[str, Path, Spooled]] = []
+    try:
+        for f in files:
+            spooled.append(await _spool_pdf(f))
+    except HTTPException:
+        for _, dest, _ in spooled:
+            dest.unlink(missing_ok=True)
+        raise
+    return _tag_batch([_start(doc_id, dest, sp, f.filename, PRIORITY_BULK)
+                       for (doc_id, dest, sp), f in zip(spooled, files)])
+
+def _tag_batch(results: List[dict]) -> List[dict]:
+    if results:
+        # two copies of one file share a job; count it once
+        batch_id = jobs.open_batch(list(dict.fromkeys(r["jobId"] for r in results)))
+        for r in results:
+            r["batchId"] = batch_id
     return results
 
 
-async def handle_upload_zip(zip_file: UploadFile, background_tasks: BackgroundTasks) -> List[dict]:
-    batch_id = uuid4().hex[:8]
-    tmp_dir = DATA_DIR / "tmp" / f"zip_{batch_id}"
+def _get_zip_pool() -> ThreadPoolExecutor:
+    global _zip_pool
+    with _scheduler_lock:
+        if _zip_pool is None:
+            _zip_pool = ThreadPoolExecutor(max_workers=max(1, ZIP_WORKERS), thread_name_prefix="zip-expand")
+        return _zip_pool
+
+def _member_source(zip_path: Path, member: str) -> str:
+    return json.dumps([str(zip_path), member])
+
+def _expand_member(zip_path: Path, member: str, doc_id: str, job_id: str) -> None:
+    orig_name = Path(member).name or "file.pdf"
+    base = {"jobId": job_id, "docId": doc_id}
+    pdf_dest = DATA_DIR / "docs" / f"{doc_id}.pdf"
+    try:
+        # one handle per worker so members decompress in parallel
+        with zipfile.ZipFile(zip_path, "r") as z:
+            sp = spool_member(z, z.getinfo(member), pdf_dest, limit=MAX_UPLOAD_BYTES)
+    except SpoolTooLarge as e:
+        _write_job(job_id, {**base, "status": "error", "error": f"{orig_name} {e}.", "progress": 0})
+        return
+    except (zipfile.BadZipFile, KeyError, OSError) as e:
+        _write_job(job_id, {**base, "status": "error", "error": f"could not extract {orig_name}: {e}", "progress": 0})
+        return
+    if not sp.looks_like_pdf:
+        pdf_dest.unlink(missing_ok=True)
+        _write_job(job_id, {**base, "status": "error", "error": f"Not a PDF file: {orig_name}", "progress": 0})
+        return
+    # the hash came out of the same pass that extracted the member; the claim also clears source,
+    # so from here on the job resumes from its PDF like any other upload
+    dup = _dedupe(sp.sha256, doc_id, job_id, orig_name, pdf_dest, PRIORITY_BATCH, keep_job=True)
+    if dup:
+        pdf_dest.unlink(missing_ok=True)
+        jobs.drop(job_id)
+        return
+    kickoff_indexing(doc_id, pdf_dest, job_id, orig_name, priority=PRIORITY_BATCH, stage="queued")
+
+def _expand_zip(tmp_dir: Path, zip_path: Path, planned: List[Tuple[str, str, str]]) -> None:
+    remaining = [len(planned)]
+    lock = threading.Lock()
+
+    def _finished(fut, doc_id: str, job_id: str) -> None:
+        if not fut.cancelled() and fut.exception() is not None:
+            _write_job(job_id, {"jobId": job_id, "docId": doc_id, "status": "error",
+                                "error": str(fut.exception()), "progress": 0})
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    pool = _get_zip_pool()
+    for member, doc_id, job_id in planned:
+        fut = pool.submit(_expand_member, zip_path, member, doc_id, job_id)
+        fut.add_done_callback(lambda f, d=doc_id, j=job_id: _finished(f, d, j))
+
+
+async def handle_upload_zip(zip_file: UploadFile) -> List[dict]:
+    tmp_dir = DATA_DIR / "tmp" / f"zip_{uuid4().hex[:8]}"
     tmp_dir.mkdir(parents=True, exist_ok=True)
     zip_path = tmp_dir / "upload.zip"
-    with zip_path.open("wb") as out:
-        while True:
-            chunk = await zip_file.read(2 * 1024 * 1024) 
-            if not chunk:
-                break
-            out.write(chunk)
-    await zip_file.close()
-
-    results: List[dict] = []
-    seen: Set[Tuple[int, int]] = set()  
+    try:
+        await spool_upload(zip_file, zip_path, limit=MAX_UPLOAD_BYTES)
+    except SpoolTooLarge as e:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise HTTPException(status_code=413, detail=f"{zip_file.filename} {e}.")
+    finally:
+        await zip_file.close()
 
     with zipfile.ZipFile(zip_path, "r") as z:
         members = []
@@ -94,29 +293,35 @@ async def handle_upload_zip(zip_file: UploadFile, background_tasks: BackgroundTa
 
         if not members:
             shutil.rmtree(tmp_dir, ignore_errors=True)
-            return results
+            return []
 
         members = members[: MAX_PDFS_PER_ZIP]
+        try:
+            _admit(len(members))
+        except HTTPException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
 
-        for m in members:
-            sig = (m.CRC, m.file_size)
-            if sig in seen:
-                continue
-            seen.add(sig)
-
-            data = z.read(m)
-            if not _is_probably_pdf(data):
-                continue
-
-            orig_name = Path(m.filename).name or "file.pdf"
-            doc_id = uuid4().hex[:12]
-            pdf_dest = DATA_DIR / "docs" / f"{doc_id}.pdf"
-            _write_bytes(pdf_dest, data)
-
-            job_id = uuid4().hex[:12]
-            _write_job(job_id, {"jobId": job_id, "docId": doc_id, "status": "queued", "progress": 0})
-            background_tasks.add_task(kickoff_indexing, doc_id, pdf_dest, job_id, orig_name)
-            results.append({"jobId": job_id, "docId": doc_id})
+    results: List[dict] = []
+    planned: List[Tuple[str, str, str]] = []
+    first: Dict[Tuple[int, int], dict] = {}
+    for m in members:
+        sig = (m.CRC, m.file_size)
+        if sig in first:
+            # same bytes as an earlier member by the zip directory's CRC and size; it shares that job
+            results.append({**first[sig], "duplicate": True})
+            continue
+        doc_id = uuid4().hex[:12]
+        job_id = uuid4().hex[:12]
+        # every member has a job row (and so a /status, on any worker) before its id is handed out;
+        # source lets a restart extract members this process never got to
+        job_store.create(job_id, doc_id, DATA_DIR / "docs" / f"{doc_id}.pdf", Path(m.filename).name or "file.pdf",
+                         PRIORITY_BATCH, source=_member_source(zip_path, m.filename))
+        _write_job(job_id, {"jobId": job_id, "docId": doc_id, "status": "queued", "progress": 0})
+        first[sig] = {"jobId": job_id, "docId": doc_id}
+        results.append(dict(first[sig]))
+        planned.append((m.filename, doc_id, job_id))
 
-    shutil.rmtree(tmp_dir, ignore_errors=True)
+    _tag_batch(results)
+    _expand_zip(tmp_dir, zip_path, planned)
     return results
@@ -0,0 +1,195 @@
+from __future__ import annotations
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+import json
+import os
+import socket
+import sqlite3
+import time
+from uuid import uuid4
+
+from app.utils.config import DATA_DIR
+
+PATH: Path = DATA_DIR / "jobs.db"
+
+STAGES = ("queued", "sectioned", "sentences", "embedded", "indexed")
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+def _proc_start(pid: int) -> Optional[str]:
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return None
+    # starttime is field 22; the command name before it may contain spaces, so count from its ")"
+    return stat.rsplit(")", 1)[1].split()[19]
+
+# host:pid:start -- a restarted container reuses hostname and PID 1, but never the process start time
+_OWNER = f"{socket.gethostname()}:{os.getpid()}:{_proc_start(os.getpid()) or uuid4().hex[:12]}"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id    TEXT PRIMARY KEY,
+    doc_id    TEXT NOT NULL,
+    pdf_path  TEXT NOT NULL,
+    orig_name TEXT,
+    priority  INTEGER NOT NULL DEFAULT 5,
+    status    TEXT NOT NULL,
+    stage     TEXT NOT NULL DEFAULT 'queued',
+    progress  INTEGER NOT NULL DEFAULT 0,
+    error     TEXT,
+    attempts  INTEGER NOT NULL DEFAULT 0,
+    owner     TEXT,
+    source    TEXT,
+    duplicate_of TEXT,
+    created   REAL NOT NULL,
+    updated   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status);
+CREATE INDEX IF NOT EXISTS jobs_doc ON jobs(doc_id);
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    job_ids  TEXT NOT NULL,
+    created  REAL NOT NULL
+);
+"""
+
+_ready = False
+
+def _connect() -> sqlite3.Connection:
+    global _ready
+    conn = sqlite3.connect(str(PATH), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if not _ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        # zip members waiting to be extracted record their archive in source, and members that turn
+        # out to be copies of an earlier upload point at its job in duplicate_of; older stores lack both
+        have = {r["name"] for r in conn.execute("PRAGMA table_info(jobs)")}
+        for col in ("source", "duplicate_of"):
+            if col not in have:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {col} TEXT")
+        _ready = True
+    return conn
+
+def stage_index(stage: Optional[str]) -> int:
+    return STAGES.index(stage) if stage in STAGES else 0
+
+def create(job_id: str, doc_id: str, pdf_path: Path, orig_name: Optional[str], priority: int,
+           source: Optional[str] = None) -> None:
+    now = time.time()
+    with closing(_connect()) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO jobs (job_id, doc_id, pdf_path, orig_name, priority, status, owner, source,"
+            " created, updated) VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, doc_id, str(pdf_path), orig_name, int(priority), _OWNER, source, now, now),
+        )
+
+def redirect(job_id: str, doc_id: str, original_job_id: str) -> None:
+    with closing(_connect()) as conn:
+        conn.execute(
+            "UPDATE jobs SET doc_id = ?, duplicate_of = ?, source = NULL, status = 'done', progress = 100,"
+            " updated = ? WHERE job_id = ?",
+            (doc_id, original_job_id, time.time(), job_id),
+        )
+
+def delete(job_id: str) -> None:
+    with closing(_connect()) as conn:
+        conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+def update(job_id: str, payload: Dict[str, Any]) -> None:
+    sets, args = ["updated = ?"], [time.time()]
+    for col, key in (("status", "status"), ("progress", "progress"), ("error", "error"), ("stage", "stage"),
+                     ("source", "source")):
+        if key in payload:
+            sets.append(f"{col} = ?")
+            args.append(payload[key])
+    with closing(_connect()) as conn:
+        if "stage" in payload:
+            # stages only move forward; a stale progress event must not rewind a checkpoint
+            conn.execute(
+                f"UPDATE jobs SET {', '.join(sets)} WHERE job_id = ? AND "
+                f"(CASE stage {' '.join(f'WHEN {s!r} THEN {i}' for i, s in enumerate(STAGES))} ELSE 0 END) <= ?",
+                (*args, job_id, stage_index(payload["stage"])),
+            )
+        else:
+            conn.execute(f"UPDATE jobs SET {', '.join(sets)} WHERE job_id = ?", (*args, job_id))
+
+def get(job_id: str) -> Optional[Dict[str, Any]]:
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return dict(row) if row else None
+
+def latest_for_doc(doc_id: str) -> Optional[Dict[str, Any]]:
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE doc_id = ? ORDER BY created DESC LIMIT 1", (doc_id,)).fetchone()
+    return dict(row) if row else None
+
+def get_many(job_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    with closing(_connect()) as conn:
+        for i in range(0, len(job_ids), 500):
+            chunk = job_ids[i:i + 500]
+            rows = conn.execute(
+                f"SELECT * FROM jobs WHERE job_id IN ({', '.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            out.update((r["job_id"], dict(r)) for r in rows)
+    return out
+
+def create_batch(batch_id: str, job_ids: List[str]) -> None:
+    with closing(_connect()) as conn:
+        conn.execute("INSERT OR REPLACE INTO batches (batch_id, job_ids, created) VALUES (?, ?, ?)",
+                     (batch_id, json.dumps(job_ids), time.time()))
+
+def get_batch(batch_id: str) -> Optional[List[str]]:
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT job_ids FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+    return json.loads(row["job_ids"]) if row else None
+
+def _owner_alive(owner: Optional[str]) -> bool:
+    if not owner:
+        return False
+    if owner == _OWNER:
+        return True
+    host, _, rest = owner.partition(":")
+    pid, _, started = rest.partition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    if int(pid) == os.getpid():
+        # an earlier process that had our pid (e.g. PID 1 before a container restart)
+        return False
+    live_start = _proc_start(int(pid))
+    if started and live_start is not None:
+        return live_start == started
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def claim_unfinished() -> List[Dict[str, Any]]:
+    claimed: List[Dict[str, Any]] = []
+    with closing(_connect()) as conn:
+        rows = conn.execute(
+            "SELECT * FROM jobs WHERE status IN ('queued', 'running') ORDER BY priority, created"
+        ).fetchall()
+        for row in rows:
+            if _owner_alive(row["owner"]):
+                continue
+            cur = conn.execute(
+                "UPDATE jobs SET owner = ?, attempts = attempts + 1, updated = ?"
+                " WHERE job_id = ? AND owner IS ?",
+                (_OWNER, time.time(), row["job_id"], row["owner"]),
+            )
+            if cur.rowcount != 1:
+                continue
+            job = dict(row)
+            job["attempts"] += 1
+            if job["attempts"] > MAX_ATTEMPTS:
+                update(job["job_id"], {"status": "error", "progress": 0,
+                                       "error": f"gave up after {MAX_ATTEMPTS} interrupted attempts"})
+                continue
+            claimed.append(job)
+    return claimed
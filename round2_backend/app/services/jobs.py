@@ -0,0 +1,178 @@
+from __future__ import annotations
+from collections import Counter, OrderedDict
+from uuid import uuid4
+from typing import Any, Dict, Iterable, List, Optional, Set
+import asyncio
+import json
+import os
+import threading
+
+from app.utils.config import DATA_DIR
+from app.services import job_store
+
+JOB_REGISTRY_MAX = int(os.getenv("JOB_REGISTRY_MAX", "20000"))
+JOB_SNAPSHOT = os.getenv("JOB_SNAPSHOT", "0") == "1"
+
+TERMINAL = ("done", "error")
+
+
+def is_terminal(state: Optional[Dict[str, Any]]) -> bool:
+    return bool(state) and state.get("status") in TERMINAL
+
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, job_ids: Optional[Set[str]]):
+        self.loop = loop
+        self.job_ids = job_ids
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+
+    def wants(self, job_id: str) -> bool:
+        return self.job_ids is None or job_id in self.job_ids
+
+
+class JobRegistry:
+    """Latest state of every job this process has seen, plus push delivery to listeners."""
+
+    def __init__(self, max_jobs: int = JOB_REGISTRY_MAX):
+        self.max_jobs = max(1, max_jobs)
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._batches: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._subs: List[_Subscriber] = []
+        self._lock = threading.Lock()
+
+    def update(self, job_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            state = {**self._jobs.pop(job_id, {}), **payload}
+            self._jobs[job_id] = state
+            self._evict()
+            subs = [s for s in self._subs if s.wants(job_id)]
+        for s in subs:
+            try:
+                s.loop.call_soon_threadsafe(s.queue.put_nowait, dict(state))
+            except RuntimeError:
+                # listener's loop already closed
+                self.unsubscribe(s)
+        return state
+
+    def _evict(self) -> None:
+        # oldest finished jobs go first; live ones are never dropped
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for job_id in [j for j, st in self._jobs.items() if is_terminal(st)]:
+            del self._jobs[job_id]
+            if len(self._jobs) <= self.max_jobs:
+                return
+
+    def forget(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            st = self._jobs.get(job_id)
+            return dict(st) if st else None
+
+    def many(self, job_ids: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        with self._lock:
+            return {j: (dict(self._jobs[j]) if j in self._jobs else None) for j in job_ids}
+
+    def add_batch(self, batch_id: str, job_ids: List[str]) -> None:
+        with self._lock:
+            self._batches[batch_id] = list(job_ids)
+            while len(self._batches) > self.max_jobs:
+                self._batches.popitem(last=False)
+
+    def batch(self, batch_id: str) -> Optional[List[str]]:
+        with self._lock:
+            ids = self._batches.get(batch_id)
+            return list(ids) if ids is not None else None
+
+    def subscribe(self, job_ids: Optional[Iterable[str]] = None) -> _Subscriber:
+        sub = _Subscriber(asyncio.get_running_loop(), set(job_ids) if job_ids is not None else None)
+        with self._lock:
+            self._subs.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: _Subscriber) -> None:
+        with self._lock:
+            if sub in self._subs:
+                self._subs.remove(sub)
+
+
+registry = JobRegistry()
+
+
+def _from_row(job: Dict[str, Any]) -> Dict[str, Any]:
+    if job.get("duplicate_of"):
+        # a zip member that turned out to be a copy of an earlier upload reports that upload's progress
+        orig = lookup(job["duplicate_of"]) or {"status": "unknown", "progress": 0}
+        return {**orig, "jobId": job["job_id"], "docId": job["doc_id"], "duplicate": True,
+                "duplicateOf": job["duplicate_of"]}
+    out = {"jobId": job["job_id"], "docId": job["doc_id"], "status": job["status"], "progress": job["progress"]}
+    if job["error"]:
+        out["error"] = job["error"]
+    return out
+
+def _from_store(job_id: str) -> Optional[Dict[str, Any]]:
+    job = job_store.get(job_id)
+    return _from_row(job) if job else None
+
+def lookup(job_id: str) -> Optional[Dict[str, Any]]:
+    # jobs run by another worker process are only visible through the shared store
+    st = registry.get(job_id)
+    if st is not None:
+        return st
+    p = DATA_DIR / "tmp" / f"{job_id}.json"
+    if p.exists():
+        return json.loads(p.read_text())
+    return _from_store(job_id)
+
+def record(job_id: str, payload: Dict[str, Any]) -> None:
+    prev = registry.get(job_id)
+    registry.update(job_id, payload)
+    if JOB_SNAPSHOT:
+        (DATA_DIR / "tmp" / f"{job_id}.json").write_text(json.dumps(registry.get(job_id)))
+    # plain progress ticks stay in memory; the store only needs what resume depends on
+    if prev is None or "stage" in payload or payload.get("status") != prev.get("status"):
+        job_store.update(job_id, payload)
+
+def drop(job_id: str) -> None:
+    """Forget this process's copy of a job, so lookups read its row from the store."""
+    registry.forget(job_id)
+    (DATA_DIR / "tmp" / f"{job_id}.json").unlink(missing_ok=True)
+
+def open_batch(job_ids: List[str]) -> str:
+    batch_id = uuid4().hex[:12]
+    registry.add_batch(batch_id, job_ids)
+    job_store.create_batch(batch_id, job_ids)
+    return batch_id
+
+def batch_jobs(batch_id: str) -> Optional[List[str]]:
+    ids = registry.batch(batch_id)
+    return ids if ids is not None else job_store.get_batch(batch_id)
+
+def lookup_many(job_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    states = registry.many(job_ids)
+    missing = [j for j, st in states.items() if st is None]
+    if missing:
+        rows = job_store.get_many(missing)
+        for j in missing:
+            p = DATA_DIR / "tmp" / f"{j}.json"
+            if p.exists():
+                states[j] = json.loads(p.read_text())
+            elif j in rows:
+                states[j] = _from_row(rows[j])
+    return states
+
+def summarize(job_ids: List[str]) -> Dict[str, Any]:
+    states = lookup_many(job_ids)
+    counts = Counter(st["status"] if st else "unknown" for st in states.values())
+    total = len(job_ids)
+    progress = sum(st.get("progress", 0) if st else 0 for st in states.values())
+    return {
+        "total": total,
+        "counts": dict(counts),
+        "progress": round(progress / total) if total else 100,
+        "finished": all(is_terminal(st) for st in states.values()),
+        "jobs": [states[j] or {"jobId": j, "status": "unknown", "progress": 0} for j in job_ids],
+    }
@@ -1,22 +1,26 @@
 from __future__ import annotations
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 import os
 import textwrap
 
-try:
-    import google.generativeai as genai  
-except Exception:  
-    genai = None 
-
 
 def _env(key: str, default: Optional[str] = None) -> Optional[str]:
     val = os.getenv(key)
     return val if val else default
 
 
-def _ensure_model() -> Optional["genai.GenerativeModel"]:  
+def _genai() -> Any:
+    try:
+        import google.generativeai as genai  
+    except Exception:  
+        return None
+    return genai
+
+
+def _ensure_model() -> Optional[Any]:  
     api_key = _env("GEMINI_API_KEY")
-    if not api_key or not genai:
+    genai = _genai() if api_key else None
+    if not genai:
         return None
     genai.configure(api_key=api_key)
     model_name = _env("GEMINI_MODEL", "gemini-1.5-flash")
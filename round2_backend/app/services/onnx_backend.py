@@ -0,0 +1,98 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, List, Sequence, Union
+import json
+import os
+
+import numpy as np
+
+ONNX_THREADS = int(os.getenv("EMBED_ONNX_THREADS", "0"))
+
+
+def export(model_name: str, out_dir: Path, quantize: bool = True) -> Path:
+    """Export the transformer of a SentenceTransformer to ONNX, plus what encode() needs to mirror it."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    st = SentenceTransformer(model_name, device="cpu")
+    hf = st[0].auto_model.eval()
+    tok = st.tokenizer
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in tok.model_input_names]
+
+    class _Wrapped(torch.nn.Module):
+        def __init__(self, m):
+            super().__init__()
+            self.m = m
+
+        def forward(self, *args):
+            return self.m(**dict(zip(names, args)))[0]
+
+    dummy = tok(["warm up the exporter"], return_tensors="pt")
+    path = out_dir / "model.onnx"
+    torch.onnx.export(
+        _Wrapped(hf), tuple(dummy[n] for n in names), str(path),
+        input_names=names, output_names=["last_hidden_state"],
+        dynamic_axes={**{n: {0: "batch", 1: "seq"} for n in names}, "last_hidden_state": {0: "batch", 1: "seq"}},
+        opset_version=14,
+    )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        qpath = out_dir / "model.int8.onnx"
+        quantize_dynamic(str(path), str(qpath), weight_type=QuantType.QInt8)
+        os.replace(qpath, path)
+
+    tok.save_pretrained(str(out_dir))
+    pooling = st[1].get_pooling_mode_str() if len(st) > 1 else "mean"
+    normalize = any(type(m).__name__ == "Normalize" for m in st)
+    (out_dir / "export.json").write_text(json.dumps({
+        "model": model_name, "inputs": names, "pooling": pooling, "normalize": normalize,
+        "max_seq_length": int(st.max_seq_length), "quantized": quantize,
+    }))
+    return path
+
+
+class OnnxEncoder:
+    """SentenceTransformer.encode() over an exported graph; needs onnxruntime."""
+
+    def __init__(self, model_dir: Path, threads: int = ONNX_THREADS):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_dir = Path(model_dir)
+        meta_path = model_dir / "export.json"
+        if not meta_path.exists():
+            raise FileNotFoundError(f"no ONNX export in {model_dir}; run `python -m app.cli export-onnx` first")
+        self.meta = json.loads(meta_path.read_text())
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        opts = ort.SessionOptions()
+        if threads > 0:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(model_dir / "model.onnx"), opts, providers=["CPUExecutionProvider"])
+
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        if self.meta["pooling"] == "cls":
+            return hidden[:, 0]
+        m = mask[..., None].astype("float32")
+        return (hidden * m).sum(axis=1) / np.maximum(m.sum(axis=1), 1e-9)
+
+    def encode(self, sentences: Union[str, Sequence[str]], batch_size: int = 32,
+               normalize_embeddings: bool = False, show_progress_bar: bool = False, **_: Any) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts: List[str] = [sentences] if single else list(sentences)
+        # similar lengths per batch keep padding small
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        out = np.zeros((len(texts), 0), dtype="float32")
+        for start in range(0, len(texts), max(1, batch_size)):
+            idx = order[start:start + batch_size]
+            enc = self.tokenizer([texts[i] for i in idx], padding=True, truncation=True,
+                                 max_length=self.meta["max_seq_length"], return_tensors="np")
+            feed = {n: enc[n].astype("int64") for n in self.meta["inputs"]}
+            vecs = self._pool(self.session.run(None, feed)[0], enc["attention_mask"])
+            if out.shape[1] == 0:
+                out = np.zeros((len(texts), vecs.shape[1]), dtype="float32")
+            out[idx] = vecs
+        if self.meta["normalize"] or normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out[0] if single else out
@@ -0,0 +1,74 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Dict, Optional
+import hashlib
+import os
+import threading
+import unicodedata
+
+import numpy as np
+
+from app.services import artifact_cache
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+QUERY_CACHE_SPILL = os.getenv("QUERY_CACHE_SPILL", "0") == "1"
+
+
+def normalize_query(q: str) -> str:
+    # MiniLM's tokenizer is uncased and whitespace-insensitive, so these all embed identically
+    return " ".join(unicodedata.normalize("NFKC", q or "").lower().split())
+
+
+class QueryCache:
+    """Bounded LRU of query vectors; with spill on, entries are also kept in the artifact cache on disk."""
+
+    def __init__(self, max_items: int = QUERY_CACHE_SIZE, spill: bool = QUERY_CACHE_SPILL):
+        self.max_items = max(0, max_items)
+        self.spill = spill
+        self._items: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "diskHits": 0, "evictions": 0}
+
+    @staticmethod
+    def key(query: str, model_version: str) -> str:
+        return hashlib.sha256(f"{model_version}\n{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vec = self._items.get(key)
+            if vec is not None:
+                self._items.move_to_end(key)
+                self._stats["hits"] += 1
+                return vec
+        vec = artifact_cache.load_array("queries", key) if self.spill else None
+        with self._lock:
+            if vec is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["diskHits"] += 1
+        self._remember(key, vec)
+        return vec
+
+    def put(self, key: str, vec: np.ndarray) -> None:
+        vec = np.asarray(vec, dtype="float32")
+        vec.setflags(write=False)
+        self._remember(key, vec)
+        if self.spill:
+            artifact_cache.save_array("queries", key, vec)
+
+    def _remember(self, key: str, vec: np.ndarray) -> None:
+        if self.max_items == 0:
+            return
+        with self._lock:
+            self._items[key] = vec
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "size": len(self._items), "capacity": self.max_items}
+
+
+query_cache = QueryCache()
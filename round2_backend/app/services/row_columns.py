@@ -0,0 +1,80 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence, Union
+import json
+
+import numpy as np
+
+from app.utils.atomic import atomic_save_npy, atomic_write_text
+
+# sentence hashes are unique per row and only the writer needs them (index/sentences.db has them)
+_SKIP = ("h",)
+
+
+def _kind(vals: List[Any]) -> str:
+    if all(type(v) is int for v in vals):
+        return "int"
+    if all(type(v) in (int, float) for v in vals):
+        return "float"
+    if all(v is None or isinstance(v, str) for v in vals):
+        return "str"
+    return "json"
+
+def write_columns(npy_path: Path, rows: List[Dict[str, Any]]) -> None:
+    """Mapping rows as one structured array; strings become int32 codes into a shared table."""
+    keys = [k for k in dict.fromkeys(k for r in rows for k in r) if k not in _SKIP]
+    kinds = {k: _kind([r.get(k) for r in rows]) for k in keys}
+    dtype = [(k, "<i8" if kind == "int" else "<f8" if kind == "float" else "<i4") for k, kind in kinds.items()]
+    cols = np.zeros(len(rows), dtype=dtype)
+    table: Dict[str, int] = {}
+    for k, kind in kinds.items():
+        if kind in ("int", "float"):
+            cols[k] = [r[k] for r in rows]
+            continue
+        enc = json.dumps if kind == "json" else str
+        cols[k] = [-1 if r.get(k) is None else table.setdefault(enc(r[k]), len(table)) for r in rows]
+    # the .npy lands last, so readers that see it also see a complete string table
+    atomic_write_text(npy_path.with_suffix(".json"), json.dumps({"kinds": kinds, "strings": list(table)},
+                                                                ensure_ascii=False))
+    atomic_save_npy(npy_path, cols)
+
+def load_columns(npy_path: Path) -> "ColumnRows":
+    meta = json.loads(npy_path.with_suffix(".json").read_text(encoding="utf-8"))
+    return ColumnRows(np.load(npy_path, mmap_mode="r"), meta["strings"], meta["kinds"])
+
+
+class ColumnRows(Sequence):
+    """Read-only list of mapping dicts over a memory-mapped column file; rows are built on access."""
+
+    def __init__(self, cols: np.ndarray, strings: List[str], kinds: Dict[str, str]):
+        self.cols = cols
+        self.strings = strings
+        self.kinds = kinds
+
+    def __len__(self) -> int:
+        return int(self.cols.shape[0])
+
+    def __getitem__(self, i: Union[int, slice]) -> Any:
+        if isinstance(i, slice):
+            return ColumnRows(self.cols[i], self.strings, self.kinds)
+        rec = self.cols[i]
+        out: Dict[str, Any] = {}
+        for k, kind in self.kinds.items():
+            v = rec[k]
+            if kind == "int":
+                out[k] = int(v)
+            elif kind == "float":
+                out[k] = float(v)
+            elif v >= 0:
+                out[k] = self.strings[v] if kind == "str" else json.loads(self.strings[v])
+        return out
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def column(self, key: str) -> np.ndarray:
+        if key not in self.kinds and len(self) == 0:
+            # an alias-only segment has no rows, so its column file has no fields at all
+            return np.zeros(0, dtype="<i8")
+        return self.cols[key]
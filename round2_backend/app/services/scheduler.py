@@ -0,0 +1,219 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import heapq
+import itertools
+import multiprocessing
+import os
+import threading
+
+from app.services.indexer import prepare_document
+from app.services.index_writer import get_writer
+from app.services import bulk_embed, job_store
+from app.services.job_store import stage_index
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 5
+PRIORITY_BATCH = 10
+
+INGEST_MODE = os.getenv("INGEST_POOL", "process").lower()
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "500"))
+INGEST_TORCH_THREADS = int(os.getenv("INGEST_TORCH_THREADS", "1"))
+# times a job is retried on a fresh pool after its worker process died (OOM kill, segfault)
+INGEST_POOL_RETRIES = int(os.getenv("INGEST_POOL_RETRIES", "2"))
+
+ProgressFn = Callable[[str, dict], None]
+
+
+class SchedulerFull(RuntimeError):
+    pass
+
+
+@dataclass(order=True)
+class IngestJob:
+    priority: int
+    seq: int
+    job_id: str = field(compare=False)
+    doc_id: str = field(compare=False)
+    pdf_path: Path = field(compare=False)
+    orig_name: Optional[str] = field(default=None, compare=False)
+    stage: Optional[str] = field(default=None, compare=False)
+
+
+_progress_q = None
+
+def _init_worker(q, torch_threads: int) -> None:
+    global _progress_q
+    _progress_q = q
+    # the bulk encode pool lives in the scheduler's process only; a worker never starts its own
+    bulk_embed.EMBED_BULK_WORKERS = 0
+    try:
+        import torch
+        torch.set_num_threads(max(1, torch_threads))
+    except Exception:
+        pass
+
+def _report(job_id: str, payload: dict) -> None:
+    _progress_q.put((job_id, payload))
+
+def _prepare_in_worker(doc_id: str, pdf_path: str, job_id: str, orig_name: Optional[str], stage: Optional[str],
+                       embed: bool = True):
+    return prepare_document(doc_id, Path(pdf_path), job_id, progress_cb=_report,
+                            orig_name=orig_name, resume_stage=stage, embed=embed)
+
+
+class IngestScheduler:
+    def __init__(
+        self,
+        on_progress: ProgressFn,
+        workers: int = INGEST_WORKERS,
+        mode: str = INGEST_MODE,
+        max_pending: int = INGEST_MAX_PENDING,
+    ):
+        self.on_progress = on_progress
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self._heap: List[IngestJob] = []
+        self._cv = threading.Condition()
+        self._seq = itertools.count()
+        self._running = 0
+        self._active: Dict[str, int] = {}
+        self._closed = False
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        if mode == "process":
+            self._ctx = multiprocessing.get_context("spawn")
+            self._progress_q = self._ctx.Queue()
+            self._pool = self._new_pool()
+            bulk_embed.reserve_cores(self.workers * INGEST_TORCH_THREADS)
+            threading.Thread(target=self._pump_progress, name="ingest-progress", daemon=True).start()
+        self._threads = [
+            threading.Thread(target=self._dispatch, name=f"ingest-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=self._ctx,
+            initializer=_init_worker,
+            initargs=(self._progress_q, INGEST_TORCH_THREADS),
+        )
+
+    def _replace_pool(self, broken: ProcessPoolExecutor) -> None:
+        # every dispatcher sharing the dead pool lands here; only the first one rebuilds it
+        with self._pool_lock:
+            if self._pool is broken and not self._closed:
+                print("[INGEST] Worker process died; starting a fresh process pool")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._pool = self._new_pool()
+
+    def _prepare_pooled(self, job: IngestJob):
+        for attempt in range(INGEST_POOL_RETRIES + 1):
+            pool = self._pool
+            try:
+                return pool.submit(
+                    _prepare_in_worker, job.doc_id, str(job.pdf_path), job.job_id, job.orig_name, job.stage,
+                    bulk_embed.EMBED_BULK_WORKERS <= 0,
+                ).result()
+            except BrokenProcessPool:
+                self._replace_pool(pool)
+                if attempt == INGEST_POOL_RETRIES or self._closed:
+                    raise RuntimeError(f"ingest worker process died {attempt + 1} times on this document")
+                # pick up from whatever stage the dead worker checkpointed
+                row = job_store.get(job.job_id)
+                if row is not None:
+                    job.stage = row["stage"]
+
+    def has_capacity(self, n: int = 1) -> bool:
+        with self._cv:
+            return len(self._heap) + n <= self.max_pending
+
+    def submit(self, job_id: str, doc_id: str, pdf_path: Path, orig_name: Optional[str] = None,
+               priority: int = PRIORITY_BULK, stage: Optional[str] = None) -> IngestJob:
+        with self._cv:
+            if self._closed:
+                raise SchedulerFull("ingest scheduler is shut down")
+            if len(self._heap) >= self.max_pending:
+                raise SchedulerFull(f"ingest queue is full ({self.max_pending} pending)")
+            job = IngestJob(priority, next(self._seq), job_id, doc_id, Path(pdf_path), orig_name, stage)
+            heapq.heappush(self._heap, job)
+            self._cv.notify()
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        with self._cv:
+            return {"queued": len(self._heap), "running": self._running, "workers": self.workers}
+
+    def shutdown(self) -> None:
+        with self._cv:
+            self._closed = True
+            self._cv.notify_all()
+        if self._pool is not None:
+            with self._pool_lock:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._progress_q.put(None)
+
+    def _pump_progress(self) -> None:
+        while True:
+            item = self._progress_q.get()
+            if item is None:
+                return
+            self._emit(*item)
+
+    def _emit(self, job_id: str, payload: dict) -> None:
+        # worker progress arrives through the pump thread and may trail the
+        # terminal status, so only forward updates that move an active job forward
+        with self._cv:
+            terminal = payload.get("status") in ("done", "error")
+            last = self._active.get(job_id)
+            if last is None or (not terminal and payload.get("progress", 0) < last):
+                return
+            if terminal:
+                self._active.pop(job_id, None)
+            else:
+                self._active[job_id] = payload.get("progress", 0)
+        self.on_progress(job_id, payload)
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._cv:
+                while not self._heap and not self._closed:
+                    self._cv.wait()
+                if self._closed:
+                    return
+                job = heapq.heappop(self._heap)
+                self._running += 1
+            try:
+                self._run(job)
+            finally:
+                with self._cv:
+                    self._running -= 1
+
+    def _run(self, job: IngestJob) -> None:
+        base = {"jobId": job.job_id, "docId": job.doc_id}
+        with self._cv:
+            self._active[job.job_id] = 0
+        self._emit(job.job_id, {**base, "status": "running", "progress": 5})
+        try:
+            if stage_index(job.stage) < stage_index("indexed"):
+                if self._pool is None:
+                    vecs, mapping = prepare_document(job.doc_id, job.pdf_path, job.job_id, progress_cb=self._emit,
+                                                     orig_name=job.orig_name, resume_stage=job.stage)
+                else:
+                    vecs, mapping = self._prepare_pooled(job)
+                if vecs is None:
+                    # the worker stopped after splitting sentences; this process's shared encode pool embeds them
+                    vecs, mapping = prepare_document(job.doc_id, job.pdf_path, job.job_id, progress_cb=self._emit,
+                                                     orig_name=job.orig_name, resume_stage="sentences")
+                get_writer().add(vecs, mapping)
+            self._emit(job.job_id, {**base, "status": "running", "progress": 95, "stage": "indexed"})
+            self._emit(job.job_id, {**base, "status": "done", "progress": 100})
+        except Exception as e:
+            self._emit(job.job_id, {**base, "status": "error", "error": str(e), "progress": 0})
@@ -6,13 +6,14 @@ from collections import defaultdict
 import json
 import re
 import os  
+import threading
 
-import faiss
 import numpy as np
 from rank_bm25 import BM25Okapi
 
 from app.utils.config import DATA_DIR
-from app.services.embeddings import get_model
+from app.services.embeddings import encode_queries
+from app.services.vector_store import SegmentSet, open_segments, read_manifest
 from app.engines.r1b.rerank import apply_persona_reweight
 from app.engines.r1b.deep import deep_persona_reweight 
 
@@ -30,22 +31,55 @@ STOP = {
 def _tok(s: str) -> List[str]:
     return [w for w in (w.lower() for w in _RE_WORD.findall(s or "")) if w not in STOP and len(w) > 1]
 
-@lru_cache(maxsize=1)
-def _load_faiss() -> Tuple[faiss.Index, List[Dict]]:
-    idx_path = INDEX_DIR / "faiss.index"
-    map_path = INDEX_DIR / "mapping.jsonl"
-    if not idx_path.exists():
-        raise RuntimeError("Vector index not found. Ingest PDFs first.")
-    index = faiss.read_index(str(idx_path))
-    mapping: List[Dict] = []
-    if not map_path.exists():
-        raise RuntimeError("mapping.jsonl not found in index directory.")
-    with map_path.open("r", encoding="utf-8") as f:
-        for ln in f:
-            ln = ln.strip()
-            if ln:
-                mapping.append(json.loads(ln))
-    return index, mapping
+class _IndexHolder:
+    def __init__(self, index_dir: Path):
+        self.index_dir = index_dir
+        self._lock = threading.Lock()
+        self._snap: Optional[SegmentSet] = None
+        self._token: Optional[Tuple[int, int]] = None
+
+    def _stat_token(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = (self.index_dir / "faiss_meta.json").stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _reload(self, token: Optional[Tuple[int, int]]) -> None:
+        loaded = {s.name: s for s in self._snap.segments} if self._snap else None
+        for _ in range(3):
+            try:
+                snap = open_segments(self.index_dir, read_manifest(self.index_dir), loaded)
+                break
+            except FileNotFoundError:
+                # a compaction retired a segment between reading the manifest and opening it
+                continue
+        else:
+            raise RuntimeError("Vector index changed while loading; retry the query.")
+        if not snap.segments:
+            raise RuntimeError("Vector index not found. Ingest PDFs first.")
+        self._snap = snap
+        self._token = token
+
+    def get(self) -> SegmentSet:
+        token = self._stat_token()
+        snap = self._snap
+        if snap is not None and token == self._token:
+            return snap
+        # in-flight searches keep the previous snapshot while one thread reloads
+        if not self._lock.acquire(blocking=snap is None):
+            return snap
+        try:
+            if self._snap is None or token != self._token:
+                self._reload(token)
+            return self._snap
+        finally:
+            self._lock.release()
+
+_INDEX = _IndexHolder(INDEX_DIR)
+
+def _load_faiss() -> SegmentSet:
+    return _INDEX.get()
 
 @lru_cache(maxsize=512)
 def _load_sentences(doc_id: str) -> List[Dict]:
@@ -140,25 +174,21 @@ def related_search(
     persona: Optional[str] = None,
     task: Optional[str] = None,
     deep: bool = False,
+    ef_search: Optional[int] = None,
+    nprobe: Optional[int] = None,
 ) -> List[Dict]:
-    index, mapping = _load_faiss()
-    model = get_model()
+    snap = _load_faiss()
 
     blocked = _current_blocklist()
 
-    qv = model.encode([query], normalize_embeddings=True)
-    qv = np.asarray(qv[0], dtype="float32").reshape(1, -1)
+    qv = encode_queries([query])
     topN = max(50, k * 10)
-    D, I = index.search(qv, topN)
-    scores = D[0]; ids = I[0]
+    hits = snap.search(qv, topN, ef_search=ef_search, nprobe=nprobe)
 
     best_by_section: Dict[tuple, Dict] = {}
     qtok = _tok(query)
     filter_set = set(doc_filter) if doc_filter else None
-    for score, ridx in zip(scores, ids):
-        if ridx < 0:
-            continue
-        meta = mapping[ridx]
+    for score, meta in hits:
         if meta.get("docId") in blocked:
             continue
         if filter_set and meta.get("docId") not in filter_set:
@@ -0,0 +1,69 @@
+from __future__ import annotations
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+import hashlib
+import os
+import sqlite3
+
+import numpy as np
+
+from app.services import ann
+from app.services.artifact_cache import CACHE_DIR
+
+PATH: Path = CACHE_DIR / "sentences.db"
+ENABLED = os.getenv("SENTENCE_CACHE", "1").lower() not in ("0", "false", "no")
+
+_ready = False
+
+def _connect() -> sqlite3.Connection:
+    global _ready
+    PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(PATH), timeout=30, isolation_level=None)
+    if not _ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS vecs (key TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+        # vectors are kept in the index's storage dtype; rows written before that are fp32
+        if "dtype" not in {r[1] for r in conn.execute("PRAGMA table_info(vecs)")}:
+            conn.execute("ALTER TABLE vecs ADD COLUMN dtype TEXT NOT NULL DEFAULT 'float32'")
+        _ready = True
+    return conn
+
+def sentence_key(text: str, model_version: str) -> str:
+    return hashlib.sha256(f"{model_version}\0{text}".encode("utf-8")).hexdigest()[:32]
+
+def get_many(keys: List[str]) -> Dict[str, np.ndarray]:
+    out: Dict[str, np.ndarray] = {}
+    if not ENABLED or not keys:
+        return out
+    with closing(_connect()) as conn:
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = conn.execute(f"SELECT key, vec, dtype FROM vecs WHERE key IN ({', '.join('?' * len(chunk))})",
+                                chunk)
+            out.update((k, np.frombuffer(v, dtype=dt).astype("float32")) for k, v, dt in rows)
+    return out
+
+def put_many(items: Iterable[Tuple[str, np.ndarray]]) -> None:
+    if not ENABLED:
+        return
+    dtype = ann.archive_dtype()
+    rows = [(k, np.ascontiguousarray(v, dtype=dtype).tobytes(), dtype) for k, v in items]
+    if not rows:
+        return
+    with closing(_connect()) as conn:
+        conn.execute("BEGIN")
+        conn.executemany("INSERT OR IGNORE INTO vecs (key, vec, dtype) VALUES (?, ?, ?)", rows)
+        conn.execute("COMMIT")
+
+def convert(dtype: str) -> int:
+    """Rewrite every cached vector stored in another dtype; returns how many changed."""
+    if not PATH.exists():
+        return 0
+    with closing(_connect()) as conn:
+        rows = conn.execute("SELECT key, vec, dtype FROM vecs WHERE dtype != ?", (dtype,)).fetchall()
+        conn.execute("BEGIN")
+        conn.executemany("UPDATE vecs SET vec = ?, dtype = ? WHERE key = ?",
+                         [(np.frombuffer(v, dtype=dt).astype(dtype).tobytes(), dtype, k) for k, v, dt in rows])
+        conn.execute("COMMIT")
+    return len(rows)
@@ -0,0 +1,100 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Optional
+import hashlib
+import os
+import zipfile
+
+from fastapi import UploadFile
+
+CHUNK_SIZE = 1024 * 1024
+HEAD_SIZE = 1024
+
+
+class SpoolTooLarge(Exception):
+    def __init__(self, limit: int):
+        super().__init__(f"exceeds the {limit / (1024 * 1024):g} MB limit")
+        self.limit = limit
+
+
+@dataclass
+class Spooled:
+    path: Path
+    sha256: str
+    size: int
+    head: bytes
+    tail: bytes = b""
+
+    @property
+    def has_pdf_magic(self) -> bool:
+        # the PDF spec allows the header anywhere in the first 1024 bytes
+        return b"%PDF-" in self.head
+
+    @property
+    def looks_like_pdf(self) -> bool:
+        # header up front plus the xref pointer / EOF marker at the end; catches
+        # truncated members without parsing the document
+        return self.has_pdf_magic and (b"startxref" in self.tail or b"%%EOF" in self.tail)
+
+
+class _Sink:
+    def __init__(self, dest: Path, limit: Optional[int]):
+        self.dest = dest
+        self.limit = limit
+        self.tmp = dest.with_name(dest.name + ".part")
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+        self.tail = b""
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        self.out: IO[bytes] = self.tmp.open("wb")
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.limit is not None and self.size > self.limit:
+            raise SpoolTooLarge(self.limit)
+        if len(self.head) < HEAD_SIZE:
+            self.head += chunk[: HEAD_SIZE - len(self.head)]
+        self.tail = (self.tail + chunk[-HEAD_SIZE:])[-HEAD_SIZE:]
+        self.hash.update(chunk)
+        self.out.write(chunk)
+
+    def finish(self) -> Spooled:
+        self.out.close()
+        os.replace(self.tmp, self.dest)
+        return Spooled(self.dest, self.hash.hexdigest(), self.size, self.head, self.tail)
+
+    def abort(self) -> None:
+        self.out.close()
+        self.tmp.unlink(missing_ok=True)
+
+
+async def spool_upload(file: UploadFile, dest: Path, limit: Optional[int] = None) -> Spooled:
+    sink = _Sink(dest, limit)
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            sink.write(chunk)
+    except BaseException:
+        sink.abort()
+        raise
+    return sink.finish()
+
+
+def spool_member(z: zipfile.ZipFile, info: zipfile.ZipInfo, dest: Path, limit: Optional[int] = None) -> Spooled:
+    sink = _Sink(dest, limit)
+    try:
+        with z.open(info) as src:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                sink.write(chunk)
+    except BaseException:
+        sink.abort()
+        raise
+    return sink.finish()
+
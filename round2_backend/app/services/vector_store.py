@@ -1,88 +1,437 @@
 from __future__ import annotations
 from pathlib import Path
 import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from contextlib import contextmanager
+from uuid import uuid4
 import numpy as np
-import faiss
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional, TYPE_CHECKING
+
+from app.services import ann
+from app.utils.atomic import atomic_path, atomic_save_npy, atomic_write_text
+from app.services.row_columns import ColumnRows, load_columns, write_columns
+
+if TYPE_CHECKING:
+    import faiss
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SEGMENT_BASE = int(os.getenv("INDEX_SEGMENT_BASE", "20000"))
+# store a repeated sentence's vector once; later copies become alias rows pointing at its vecId
+INDEX_DEDUP_SENTENCES = os.getenv("INDEX_DEDUP_SENTENCES", "0") == "1"
+MERGE_FACTOR = max(2, int(os.getenv("INDEX_MERGE_FACTOR", "8")))
+# map segment indexes and mapping columns read-only, so every worker on a host shares one page-cache copy
+INDEX_MMAP = os.getenv("INDEX_MMAP", "0") == "1"
+
+_MANIFEST_LOCK = threading.Lock()
+_mmap_warned = False
+_COMPACT_LOCK = threading.Lock()
+
+@contextmanager
+def _manifest_lock(index_dir: Path):
+    # the thread lock covers writers in this process, flock covers other workers
+    with _MANIFEST_LOCK:
+        if fcntl is None:
+            yield
+            return
+        with (Path(index_dir) / ".lock").open("a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+def read_manifest(index_dir: Path) -> Dict[str, Any]:
+    meta_path = Path(index_dir) / "faiss_meta.json"
+    try:
+        meta = json.loads(meta_path.read_text())
+    except Exception:
+        meta = {}
+    meta.setdefault("generation", 0)
+    meta.setdefault("segments", [])
+    return meta
+
+def read_generation(index_dir: Path) -> int:
+    return int(read_manifest(index_dir)["generation"])
+
+def _level(ntotal: int) -> int:
+    lvl, cap = 0, SEGMENT_BASE
+    while ntotal > cap:
+        cap *= MERGE_FACTOR
+        lvl += 1
+    return lvl
+
+def _plan_merge(entries: List[Dict[str, Any]]) -> Optional[Tuple[int, int]]:
+    start = 0
+    for i in range(1, len(entries) + 1):
+        if i == len(entries) or _level(entries[i]["ntotal"]) != _level(entries[start]["ntotal"]):
+            if i - start >= MERGE_FACTOR:
+                return start, start + MERGE_FACTOR
+            start = i
+    return None
+
+def _plan_rebuild(entries: List[Dict[str, Any]]) -> Optional[Tuple[int, int]]:
+    # a segment that grew past (or was configured away from) its index layout gets rebuilt alone
+    for i, e in enumerate(entries):
+        if (e.get("kind", "flat"), e.get("storage", "fp32")) != ann.layout(int(e["ntotal"])):
+            return i, i + 1
+    return None
+
+
+def mmap_status() -> str:
+    """on, off, or partial: faiss builds without IO_FLAG_MMAP_IFC only map IVF lists (and the columns)."""
+    global _mmap_warned
+    if not INDEX_MMAP:
+        return "off"
+    import faiss
+    if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        return "on"
+    if not _mmap_warned:
+        _mmap_warned = True
+        print(f"[INDEX] faiss {faiss.__version__} has no IO_FLAG_MMAP_IFC; INDEX_MMAP maps only IVF lists "
+              "and mapping columns, flat/HNSW segments are read into memory (faiss-cpu>=1.11 maps them too)")
+    return "partial"
+
+def _read_jsonl(path: Path) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    with path.open("r", encoding="utf-8") as f:
+        for ln in f:
+            ln = ln.strip()
+            if ln:
+                rows.append(json.loads(ln))
+    return rows
+
+
+class Segment:
+    def __init__(self, name: str, index: faiss.Index, rows: List[Dict[str, Any]],
+                 aliases: Optional[List[Dict[str, Any]]] = None):
+        self.name = name
+        self.index = index
+        self.rows = rows
+        self.aliases = aliases or []
+        self.kind = ann.kind_of(index)
+        # lossy segments (PQ / scalar-quantized) keep the original vectors beside them, read via mmap
+        self.archive: Optional[np.ndarray] = None
+
+    @classmethod
+    def load(cls, name: str, index_path: Path, rows_path: Path, mmap: Optional[bool] = None) -> "Segment":
+        if not index_path.exists() or not rows_path.exists():
+            raise FileNotFoundError(f"segment {name} is missing")
+        import faiss
+        mmap = INDEX_MMAP if mmap is None else mmap
+        cols_path = rows_path.with_suffix(".cols.npy")
+        if mmap:
+            flags = (faiss.IO_FLAG_MMAP_IFC if mmap_status() == "on" else faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+            index = faiss.read_index(str(index_path), flags)
+        else:
+            index = faiss.read_index(str(index_path))
+        rows = load_columns(cols_path) if mmap and cols_path.exists() else _read_jsonl(rows_path)
+        alias_path = rows_path.with_suffix(".alias.jsonl")
+        aliases = _read_jsonl(alias_path) if alias_path.exists() else []
+        seg = cls(name, index, rows[: int(index.ntotal)], aliases)
+        vec_path = index_path.with_suffix(".vecs.npy")
+        if vec_path.exists():
+            # mapped now, so a search still holding this segment keeps working after compaction unlinks it
+            seg.archive = np.load(vec_path, mmap_mode="r")
+        return seg
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.index.ntotal)
+
+    def vec_ids(self) -> np.ndarray:
+        if isinstance(self.rows, ColumnRows):
+            return np.asarray(self.rows.column("vecId"), dtype="int64")
+        return np.array([r["vecId"] for r in self.rows], dtype="int64")
+
+    def vectors(self) -> np.ndarray:
+        if self.archive is not None:
+            return np.asarray(self.archive, dtype="float32")
+        return self.index.reconstruct_n(0, self.ntotal)
+
+    def rescore(self, query_vec: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        vecs = np.asarray(self.archive[ids], dtype="float32")
+        return vecs @ query_vec[0]
+
+
+class SegmentSet:
+    def __init__(self, segments: List[Segment]):
+        self.segments = segments
+        self.ntotal = sum(s.ntotal for s in segments)
+        self.aliases: Dict[int, List[Dict[str, Any]]] = {}
+        for seg in segments:
+            for a in seg.aliases:
+                self.aliases.setdefault(int(a["vecId"]), []).append(a)
+
+    def search(self, query_vec: np.ndarray, topk: int, ef_search: Optional[int] = None,
+               nprobe: Optional[int] = None) -> List[Tuple[float, Dict[str, Any]]]:
+        hits: List[Tuple[float, Dict[str, Any]]] = []
+        for seg in self.segments:
+            if seg.ntotal == 0:
+                continue
+            params = ann.search_params(seg.kind, ef_search, nprobe)
+            rescore = ann.INDEX_RESCORE and seg.archive is not None
+            fetch = topk * ann.RESCORE_OVERFETCH if rescore else topk
+            D, I = seg.index.search(query_vec, min(fetch, seg.ntotal), params=params)
+            ids = I[0][I[0] >= 0]
+            scores = seg.rescore(query_vec, ids) if rescore and len(ids) else D[0][I[0] >= 0]
+            hits.extend((float(d), seg.rows[i]) for d, i in zip(scores, ids))
+        hits.sort(key=lambda h: -h[0])
+        hits = hits[:topk]
+        if self.aliases:
+            # a shared vector stands for every document that contains the sentence
+            hits = [(d, r) for d, row in hits for r in [row] + self.aliases.get(int(row["vecId"]), [])]
+        return hits
+
+
+def open_segments(index_dir: Path, meta: Dict[str, Any], loaded: Optional[Dict[str, Segment]] = None) -> SegmentSet:
+    index_dir = Path(index_dir)
+    loaded = loaded or {}
+    entries = meta.get("segments") or []
+    if not entries and (index_dir / "faiss.index").exists():
+        # pre-segment layout that no writer has migrated yet
+        seg = loaded.get("legacy") or Segment.load("legacy", index_dir / "faiss.index", index_dir / "mapping.jsonl")
+        return SegmentSet([seg])
+    seg_dir = index_dir / "segments"
+    segs = []
+    for e in entries:
+        name = e["name"]
+        segs.append(loaded.get(name) or Segment.load(name, seg_dir / f"{name}.index", seg_dir / f"{name}.jsonl"))
+    return SegmentSet(segs)
+
 
 class VectorStore:
     def __init__(self, index_dir: Path, dim: int = 384):
         self.index_dir = Path(index_dir)
-        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.seg_dir = self.index_dir / "segments"
+        self.seg_dir.mkdir(parents=True, exist_ok=True)
         self.index_path = self.index_dir / "faiss.index"
         self.map_path = self.index_dir / "mapping.jsonl"
         self.meta_path = self.index_dir / "faiss_meta.json"
         self.dim = dim
-        self.index = None
-        self._mapping_cache: List[Dict[str, Any]] | None = None
+        self._snap: SegmentSet | None = None
+        self._snap_gen = -1
+        self._docs: Dict[str, frozenset] = {}
         self._load()
+        if INDEX_MMAP:
+            self.ensure_columns()
 
     def _load(self):
-        if self.index_path.exists():
-            self.index = faiss.read_index(str(self.index_path))
-            self.dim = self.index.d
-        else:
-            self.index = faiss.IndexFlatIP(self.dim) 
-        if not self.meta_path.exists():
-            self.meta_path.write_text(json.dumps({"ntotal": int(self.index.ntotal)}))
+        with _manifest_lock(self.index_dir):
+            meta = read_manifest(self.index_dir)
+            if meta["segments"] or not self.index_path.exists():
+                if not self.meta_path.exists():
+                    self._commit(meta)
+                return
+            import faiss
+            index = faiss.read_index(str(self.index_path))
+            self.dim = index.d
+            name = f"seg-{uuid4().hex[:12]}"
+            os.replace(self.index_path, self.seg_dir / f"{name}.index")
+            if self.map_path.exists():
+                os.replace(self.map_path, self.seg_dir / f"{name}.jsonl")
+            else:
+                (self.seg_dir / f"{name}.jsonl").write_text("")
+            meta["segments"] = [{"name": name, "ntotal": int(index.ntotal), "kind": ann.kind_of(index),
+                                 "storage": "fp32"}]
+            self._commit(meta)
+
+    def _hash_db(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.index_dir / "sentences.db"), timeout=30, isolation_level=None)
+        conn.execute("CREATE TABLE IF NOT EXISTS sentences (h TEXT PRIMARY KEY, vec_id INTEGER NOT NULL)")
+        return conn
+
+    def _split_repeats(self, rows: List[Dict[str, Any]], start_id: int):
+        """Separate rows whose sentence is already indexed (or repeated earlier in this batch)."""
+        hashes = [r.get("h") for r in rows]
+        wanted = list({h for h in hashes if h})
+        known: Dict[str, int] = {}
+        if wanted:
+            with closing(self._hash_db()) as conn:
+                for i in range(0, len(wanted), 500):
+                    chunk = wanted[i:i + 500]
+                    known.update(conn.execute(
+                        f"SELECT h, vec_id FROM sentences WHERE h IN ({', '.join('?' * len(chunk))})", chunk))
+        keep, repeats, first_in_batch = [], [], {}
+        for i, h in enumerate(hashes):
+            if h and h in known:
+                repeats.append((i, known[h]))
+            elif h and h in first_in_batch:
+                repeats.append((i, first_in_batch[h]))
+            else:
+                if h:
+                    first_in_batch[h] = start_id + len(keep)
+                keep.append(i)
+        return keep, repeats
+
+    def _segment_docs(self, name: str) -> frozenset:
+        docs = self._docs.get(name)
+        if docs is None:
+            cols_path = self.seg_dir / f"{name}.cols.npy"
+            cols = load_columns(cols_path) if cols_path.exists() else None
+            if cols is not None and cols.kinds.get("docId") == "str":
+                found = {cols.strings[c] for c in np.unique(cols.column("docId")) if c >= 0}
+            else:
+                found = {r.get("docId") for r in _read_jsonl(self.seg_dir / f"{name}.jsonl")}
+            alias_path = self.seg_dir / f"{name}.alias.jsonl"
+            if alias_path.exists():
+                found |= {r.get("docId") for r in _read_jsonl(alias_path)}
+            docs = self._docs[name] = frozenset(found)
+        return docs
+
+    def _skip_indexed(self, meta: Dict[str, Any], rows: List[Dict[str, Any]]) -> List[int]:
+        """Positions of rows not yet in the index, so a job resumed after a crash between the
+        segment commit and its "indexed" checkpoint does not add its document twice."""
+        names = [e["name"] for e in meta["segments"]]
+        self._docs = {n: d for n, d in self._docs.items() if n in names}
+        present = frozenset().union(*(self._segment_docs(n) for n in names))
+        fresh, seen = [], set()
+        for i, r in enumerate(rows):
+            key = (r.get("docId"), r.get("sentIdx"))
+            if key[0] in present or key in seen:
+                continue
+            seen.add(key)
+            fresh.append(i)
+        return fresh
 
-    def _save(self):
-        faiss.write_index(self.index, str(self.index_path))
-        self.meta_path.write_text(json.dumps({"ntotal": int(self.index.ntotal)}))
+    def _commit(self, meta: Dict[str, Any]) -> None:
+        meta["generation"] = int(meta.get("generation", 0)) + 1
+        meta["ntotal"] = sum(int(e["ntotal"]) for e in meta["segments"])
+        atomic_write_text(self.meta_path, json.dumps(meta))
+
+    def _write_segment(self, name: str, vectors: np.ndarray, rows: List[Dict[str, Any]],
+                       aliases: Optional[List[Dict[str, Any]]] = None) -> None:
+        import faiss
+        kind, storage = ann.layout(int(vectors.shape[0]))
+        index = ann.build(vectors, kind, self.dim, storage)
+        idx_path = self.seg_dir / f"{name}.index"
+        rows_path = self.seg_dir / f"{name}.jsonl"
+        if ann.is_lossy(kind, storage):
+            atomic_save_npy(self.seg_dir / f"{name}.vecs.npy", vectors.astype(ann.archive_dtype()))
+        with atomic_path(idx_path) as tmp:
+            faiss.write_index(index, str(tmp))
+        if aliases:
+            atomic_write_text(self.seg_dir / f"{name}.alias.jsonl",
+                               "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in aliases))
+        write_columns(self.seg_dir / f"{name}.cols.npy", rows)
+        atomic_write_text(rows_path, "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows))
+
+    def ensure_columns(self) -> int:
+        """Write column files for segments that predate them; readers fall back to jsonl until then."""
+        written = 0
+        for e in read_manifest(self.index_dir)["segments"]:
+            cols_path = self.seg_dir / f"{e['name']}.cols.npy"
+            rows_path = self.seg_dir / f"{e['name']}.jsonl"
+            if cols_path.exists():
+                continue
+            try:
+                write_columns(cols_path, _read_jsonl(rows_path))
+            except FileNotFoundError:
+                # retired by a compaction in another worker
+                continue
+            written += 1
+        return written
+
+    def _drop_segment(self, name: str) -> None:
+        for ext in (".index", ".jsonl", ".alias.jsonl", ".vecs.npy", ".cols.npy", ".cols.json"):
+            (self.seg_dir / f"{name}{ext}").unlink(missing_ok=True)
 
     def add(self, vectors: np.ndarray, mapping_rows: List[Dict[str, Any]]):
         if vectors.size == 0:
             return
-        vectors = vectors.astype("float32")
+        import faiss
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
         faiss.normalize_L2(vectors)
-        start_id = int(self.index.ntotal)
-        self.index.add(vectors)
-        with self.map_path.open("a", encoding="utf-8") as f:
-            for i, row in enumerate(mapping_rows):
+        with _manifest_lock(self.index_dir):
+            meta = read_manifest(self.index_dir)
+            fresh = self._skip_indexed(meta, mapping_rows)
+            if not fresh:
+                return
+            if len(fresh) < len(mapping_rows):
+                vectors, mapping_rows = vectors[fresh], [mapping_rows[i] for i in fresh]
+            start_id = int(meta.get("ntotal", 0))
+            if INDEX_DEDUP_SENTENCES:
+                keep, repeats = self._split_repeats(mapping_rows, start_id)
+            else:
+                keep, repeats = list(range(len(mapping_rows))), []
+            rows_out = []
+            for i, src in enumerate(keep):
                 row_out = {"vecId": start_id + i}
-                row_out.update(row)
-                f.write(json.dumps(row_out, ensure_ascii=False) + "\n")
-        self._mapping_cache = None  
-        self._save()
-
-    def _load_mapping(self) -> List[Dict[str, Any]]:
-        if self._mapping_cache is not None:
-            return self._mapping_cache
-        rows: List[Dict[str, Any]] = []
-        if self.map_path.exists():
-            with self.map_path.open("r", encoding="utf-8") as f:
-                for line in f:
-                    if line.strip():
-                        rows.append(json.loads(line))
-        if rows:
-            max_id = max(r["vecId"] for r in rows)
-            arr: List[Dict[str, Any] | None] = [None] * (max_id + 1)
-            for r in rows:
-                arr[r["vecId"]] = r
-            rows = [r for r in arr if r is not None]
-        self._mapping_cache = rows
-        return rows
-
-    def search(self, query_vec: np.ndarray, topk: int = 50) -> List[Tuple[int, float]]:
-        
-        if int(self.index.ntotal) == 0:
+                row_out.update(mapping_rows[src])
+                rows_out.append(row_out)
+            aliases = [{**mapping_rows[i], "vecId": vid} for i, vid in repeats]
+            name = f"seg-{uuid4().hex[:12]}"
+            self._write_segment(name, vectors[keep], rows_out, aliases)
+            kind, storage = ann.layout(len(keep))
+            meta["segments"].append({"name": name, "ntotal": len(keep), "aliases": len(aliases),
+                                     "kind": kind, "storage": storage})
+            self._commit(meta)
+            self._docs[name] = frozenset(r.get("docId") for r in mapping_rows)
+            if INDEX_DEDUP_SENTENCES:
+                new = [(r["h"], r["vecId"]) for r in rows_out if r.get("h")]
+                if new:
+                    with closing(self._hash_db()) as conn:
+                        conn.executemany("INSERT OR IGNORE INTO sentences (h, vec_id) VALUES (?, ?)", new)
+        self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        entries = read_manifest(self.index_dir)["segments"]
+        if _COMPACT_LOCK.locked() or (_plan_merge(entries) is None and _plan_rebuild(entries) is None):
+            return
+        threading.Thread(target=self.compact, name="index-compact", daemon=True).start()
+
+    def compact(self) -> int:
+        merged = 0
+        with _COMPACT_LOCK:
+            while True:
+                entries = read_manifest(self.index_dir)["segments"]
+                span = _plan_merge(entries) or _plan_rebuild(entries)
+                if span is None:
+                    break
+                entries = read_manifest(self.index_dir)["segments"][span[0]:span[1]]
+                old = [e["name"] for e in entries]
+                segs = [Segment.load(n, self.seg_dir / f"{n}.index", self.seg_dir / f"{n}.jsonl") for n in old]
+                rows = [r for s in segs for r in s.rows]
+                aliases = [a for s in segs for a in s.aliases]
+                name = f"seg-{uuid4().hex[:12]}"
+                self._write_segment(name, np.vstack([s.vectors() for s in segs]), rows, aliases)
+                with _manifest_lock(self.index_dir):
+                    meta = read_manifest(self.index_dir)
+                    names = [e["name"] for e in meta["segments"]]
+                    i = names.index(old[0]) if old[0] in names else -1
+                    if i < 0 or names[i:i + len(old)] != old:
+                        self._drop_segment(name)
+                        break
+                    kind, storage = ann.layout(len(rows))
+                    meta["segments"][i:i + len(old)] = [{"name": name, "ntotal": len(rows), "aliases": len(aliases),
+                                                         "kind": kind, "storage": storage}]
+                    self._commit(meta)
+                for n in old:
+                    self._drop_segment(n)
+                merged += 1
+        return merged
+
+    def _snapshot(self) -> SegmentSet:
+        meta = read_manifest(self.index_dir)
+        if self._snap is None or meta["generation"] != self._snap_gen:
+            loaded = {s.name: s for s in self._snap.segments} if self._snap else None
+            self._snap = open_segments(self.index_dir, meta, loaded)
+            self._snap_gen = meta["generation"]
+        return self._snap
+
+    def search(self, query_vec: np.ndarray, topk: int = 50, ef_search: Optional[int] = None,
+               nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+
+        snap = self._snapshot()
+        if snap.ntotal == 0:
             return []
-        q = query_vec.astype("float32")
+        import faiss
+        q = np.ascontiguousarray(query_vec, dtype="float32")
         faiss.normalize_L2(q)
-        D, I = self.index.search(q, topk)
-        ids = I[0].tolist()
-        scores = D[0].tolist()
-        out = []
-        for i, s in zip(ids, scores):
-            if i == -1:
-                continue
-            out.append((int(i), float(s)))
-        return out
-
-    def resolve(self, vec_ids: List[int]) -> List[Dict[str, Any]]:
-        mapping = self._load_mapping()
-        out = []
-        for vid in vec_ids:
-            if 0 <= vid < len(mapping):
-                out.append(mapping[vid])
-        return out
+        return [(int(row["vecId"]), s) for s, row in snap.search(q, topk, ef_search, nprobe)]
@@ -0,0 +1,79 @@
+from __future__ import annotations
+from typing import Any, Dict
+import os
+import threading
+import time
+
+from app.utils.config import DATA_DIR
+
+WARMUP = os.getenv("WARMUP", "1") == "1"
+WARMUP_SENTENCE_DOCS = int(os.getenv("WARMUP_SENTENCE_DOCS", "512"))
+# a failed warm-up (model download, index on a volume still mounting) is retried with doubling waits
+WARMUP_RETRY_S = float(os.getenv("WARMUP_RETRY_S", "2"))
+WARMUP_RETRY_MAX_S = float(os.getenv("WARMUP_RETRY_MAX_S", "60"))
+
+_ready = threading.Event()
+_state: Dict[str, Any] = {"state": "pending", "steps": {}, "error": None}
+
+
+def _step(name: str, fn) -> None:
+    t0 = time.perf_counter()
+    detail = fn()
+    _state["steps"][name] = {"ms": round((time.perf_counter() - t0) * 1000), **(detail or {})}
+
+def _warm_model() -> Dict[str, Any]:
+    from app.services.embeddings import get_model
+    get_model().encode(["warm up"], normalize_embeddings=True)
+    return {}
+
+def _warm_index() -> Dict[str, Any]:
+    from app.services.search import _load_faiss
+    from app.services.vector_store import mmap_status
+    try:
+        snap = _load_faiss()
+    except RuntimeError:
+        # nothing ingested yet; the first upload builds the index
+        return {"vectors": 0, "mmap": mmap_status()}
+    return {"vectors": snap.ntotal, "segments": len(snap.segments), "mmap": mmap_status()}
+
+def _warm_sentences() -> Dict[str, Any]:
+    from app.services.search import _load_sentences
+    metas = sorted((DATA_DIR / "meta").glob("*_sentences.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    docs = [p.name[: -len("_sentences.json")] for p in metas[:WARMUP_SENTENCE_DOCS]]
+    for doc_id in docs:
+        _load_sentences(doc_id)
+    return {"docs": len(docs)}
+
+def _run() -> None:
+    wait = WARMUP_RETRY_S
+    while True:
+        _state["state"] = "warming"
+        try:
+            for name, fn in (("model", _warm_model), ("index", _warm_index), ("sentences", _warm_sentences)):
+                if name not in _state["steps"]:
+                    _step(name, fn)
+            break
+        except Exception as e:
+            _state["state"] = "error"
+            _state["error"] = str(e)
+            _state["attempts"] = _state.get("attempts", 0) + 1
+            print(f"[BOOT] Warm-up failed: {e}; retrying in {wait:g}s")
+        time.sleep(wait)
+        wait = min(WARMUP_RETRY_MAX_S, wait * 2)
+    _state["state"] = "ready"
+    _state["error"] = None
+    _ready.set()
+    print(f"[BOOT] Warm-up done: {_state['steps']}")
+
+def start_warmup() -> None:
+    if not WARMUP:
+        _state["state"] = "ready"
+        _ready.set()
+        return
+    threading.Thread(target=_run, name="warmup", daemon=True).start()
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+def status() -> Dict[str, Any]:
+    return {"ready": _ready.is_set(), **_state}
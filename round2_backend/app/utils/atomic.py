@@ -0,0 +1,32 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Union
+import os
+import threading
+
+import numpy as np
+
+PathLike = Union[str, Path]
+
+
+@contextmanager
+def atomic_path(path: PathLike) -> Iterator[Path]:
+    """Yield a temp path next to `path`; it replaces `path` only if the block completes."""
+    path = Path(path)
+    # pid + thread keep concurrent writers of the same file from sharing a temp file
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+def atomic_write_text(path: PathLike, text: str, encoding: str = "utf-8") -> None:
+    with atomic_path(path) as tmp:
+        tmp.write_text(text, encoding=encoding)
+
+def atomic_save_npy(path: PathLike, arr: np.ndarray) -> None:
+    with atomic_path(path) as tmp:
+        with tmp.open("wb") as f:
+            np.save(f, arr)
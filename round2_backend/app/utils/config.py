@@ -16,6 +16,8 @@ AZURE_TTS_ENDPOINT = os.environ.get("AZURE_TTS_ENDPOINT", "")
 ADOBE_EMBED_API_KEY = os.environ.get("ADOBE_EMBED_API_KEY", "")
 
 MAX_PDFS_PER_ZIP = int(os.environ.get("MAX_PDFS_PER_ZIP", "200"))
+MAX_UPLOAD_MB = int(os.environ.get("MAX_UPLOAD_MB", "50"))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
 
 for sub in ["docs", "meta", "vecs", "index", "audio", "tmp", "logs"]:
     (DATA_DIR / sub).mkdir(parents=True, exist_ok=True)
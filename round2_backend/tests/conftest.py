@@ -0,0 +1,29 @@
+from __future__ import annotations
+from pathlib import Path
+import os
+import sys
+import tempfile
+
+# DATA_DIR is read once at import time, so it must point somewhere disposable before app is imported
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="docintel-tests-"))
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    """Fresh jobs.db and documents.db per test."""
+    from app.services import doc_registry, job_store
+    monkeypatch.setattr(job_store, "PATH", tmp_path / "jobs.db")
+    monkeypatch.setattr(job_store, "_ready", False)
+    monkeypatch.setattr(doc_registry, "PATH", tmp_path / "documents.db")
+    monkeypatch.setattr(doc_registry, "_ready", False)
+    return job_store, doc_registry
+
+
+def unit_vectors(n: int, dim: int = 384, seed: int = 0) -> np.ndarray:
+    v = np.random.default_rng(seed).normal(size=(n, dim)).astype("float32")
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
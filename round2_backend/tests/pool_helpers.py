@@ -0,0 +1,24 @@
+from __future__ import annotations
+from pathlib import Path
+import os
+
+import numpy as np
+
+# spawn workers import these by module path, so they cannot live in a test file
+
+
+def die_once(doc_id, pdf_path, job_id, orig_name, stage, embed=True):
+    marker = Path(pdf_path).with_suffix(".died")
+    if not marker.exists():
+        marker.touch()
+        os._exit(1)
+    return np.ones((1, 384), dtype="float32"), [{"docId": doc_id, "sectionId": "s1", "sentIdx": 0}]
+
+
+def always_die(doc_id, pdf_path, job_id, orig_name, stage, embed=True):
+    os._exit(1)
+
+
+def sentences_only(doc_id, pdf_path, job_id, orig_name, stage, embed=True):
+    # what prepare_document hands back when the parent's encode pool is to embed
+    return (np.ones((1, 384), dtype="float32"), [{"docId": "worker-embedded"}]) if embed else (None, [])
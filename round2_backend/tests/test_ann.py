@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import pytest
+
+from app.services import ann
+from tests.conftest import unit_vectors
+
+
+def test_index_type_is_read_when_choosing(monkeypatch):
+    monkeypatch.setattr(ann, "INDEX_TYPE", "hnsw")
+    assert ann.choose(10) == "hnsw"
+    monkeypatch.setattr(ann, "INDEX_TYPE", "auto")
+    assert ann.choose(10) == "flat"
+    assert ann.choose(10, "hnsw") == "hnsw"
+
+
+def test_auto_picks_by_size_and_ivfpq_needs_enough_training_points(monkeypatch):
+    monkeypatch.setattr(ann, "INDEX_TYPE", "auto")
+    monkeypatch.setattr(ann, "INDEX_HNSW_MIN", 100)
+    monkeypatch.setattr(ann, "INDEX_IVFPQ_MIN", 1000)
+    assert [ann.choose(n) for n in (99, 100, 999)] == ["flat", "hnsw", "hnsw"]
+    assert ann.choose(100_000) == "ivfpq"
+    # too few points to train nlist centroids: fall back to the next kind down
+    assert ann.choose(1000) == "hnsw"
+    with pytest.raises(ValueError):
+        ann.choose(10, "lsh")
+
+
+@pytest.mark.parametrize("storage", ["fp32", "sq8"])
+def test_hnsw_segments_are_built_searched_and_recognised(tmp_path, monkeypatch, storage):
+    from app.services import vector_store as vs
+    monkeypatch.setattr(vs.VectorStore, "_maybe_compact", lambda self: None)
+    monkeypatch.setattr(ann, "INDEX_TYPE", "hnsw")
+    monkeypatch.setattr(ann, "INDEX_STORAGE", storage)
+    vecs = unit_vectors(300)
+    store = vs.VectorStore(tmp_path / "index")
+    store.add(vecs, [{"docId": "a", "sectionId": "s1", "sentIdx": i} for i in range(300)])
+
+    (entry,) = vs.read_manifest(store.index_dir)["segments"]
+    assert (entry["kind"], entry["storage"]) == ("hnsw", storage)
+    (seg,) = store._snapshot().segments
+    assert ann.kind_of(seg.index) == "hnsw"
+    assert ann.measure_recall(store._snapshot(), n_queries=20, k=5)["recallAtK"] >= 0.9
+    assert [store.search(vecs[i:i + 1], topk=1)[0][0] for i in (0, 150, 299)] == [0, 150, 299]
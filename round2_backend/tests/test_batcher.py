@@ -0,0 +1,55 @@
+from __future__ import annotations
+import queue
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.services.batcher import MicroBatcher, drain
+
+
+def test_drain_stops_at_the_size_budget():
+    q: "queue.Queue[list]" = queue.Queue()
+    for item in ([1, 2], [3], [4, 5, 6]):
+        q.put(item)
+    assert drain(q, [0], len, 4, 1.0) == [[0], [1, 2], [3]]
+    assert drain(q, q.get(), len, 100, 0.0) == [[4, 5, 6]]
+
+
+def test_batched_encodes_come_back_in_request_order():
+    b = MicroBatcher(lambda texts: np.array([[len(t)] for t in texts], dtype="float32"), max_wait_ms=20)
+    futs = [b.submit(["a" * n, "b"]) for n in range(1, 6)]
+    assert [f.result(5)[:, 0].tolist() for f in futs] == [[n, 1] for n in range(1, 6)]
+
+
+def test_concurrent_callers_share_one_model_call():
+    calls = []
+    gate = threading.Event()
+
+    def encode(texts):
+        calls.append(list(texts))
+        gate.wait(5)
+        return np.array([[len(t)] for t in texts], dtype="float32")
+
+    b = MicroBatcher(encode, max_batch=4, max_wait_ms=200)
+    # the first call holds the model while the next three queue up behind it
+    first = b.submit(["x"])
+    futs = [b.submit(["a" * n]) for n in range(1, 4)]
+    time.sleep(0.05)
+    gate.set()
+    assert first.result(5)[:, 0].tolist() == [1]
+    assert [f.result(5)[0, 0] for f in futs] == [1, 2, 3]
+    assert [len(c) for c in calls] in ([1, 3], [4])
+    assert b.stats()["texts"] == 4
+
+
+def test_a_failed_batch_fails_every_caller_in_it():
+    def encode(texts):
+        raise RuntimeError("model gone")
+
+    b = MicroBatcher(encode, max_wait_ms=50)
+    futs = [b.submit(["a"]), b.submit(["b"])]
+    for f in futs:
+        with pytest.raises(RuntimeError, match="model gone"):
+            f.result(5)
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from app.services import bulk_embed
+
+
+class _Model:
+    """Encodes a text as (length, first character), so every vector names its input."""
+
+    tokenizer = None
+    max_seq_length = 256
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, batch_size, normalize_embeddings, show_progress_bar):
+        self.batches.append(list(texts))
+        return np.array([[len(t), ord(t[0])] for t in texts], dtype="float32")
+
+
+@pytest.fixture
+def model(monkeypatch):
+    m = _Model()
+    monkeypatch.setattr(bulk_embed, "get_model", lambda: m)
+    monkeypatch.setattr(bulk_embed, "EMBED_BULK_WORKERS", 0)
+    monkeypatch.setattr(bulk_embed, "_dim", None)
+    return m
+
+
+def test_plan_batches_sorts_by_length_within_the_token_budget():
+    lengths = np.array([50, 5, 40, 5, 10, 60])
+    batches = bulk_embed.plan_batches(lengths, token_budget=100, max_batch=3)
+    assert [list(b) for b in batches] == [[1, 3, 4], [2, 0], [5]]
+    for b in batches:
+        assert len(b) * lengths[b].max() <= 100
+    assert sorted(np.concatenate(batches)) == list(range(len(lengths)))
+
+
+def test_encode_bulk_returns_vectors_in_input_order(model, monkeypatch):
+    monkeypatch.setattr(bulk_embed, "EMBED_BULK_TOKENS", 64)
+    monkeypatch.setattr(bulk_embed, "EMBED_BULK_MAX_BATCH", 4)
+    rng = np.random.default_rng(0)
+    texts = [chr(ord("a") + i % 26) * int(n) for i, n in enumerate(rng.integers(1, 120, size=50))]
+
+    out = bulk_embed.encode_bulk(texts)
+
+    # batches went out length-sorted, not in input order
+    assert len(model.batches) > 1
+    assert [t for batch in model.batches for t in batch] != texts
+    np.testing.assert_array_equal(out, [[len(t), ord(t[0])] for t in texts])
+
+
+def test_an_empty_input_has_the_model_width(model):
+    assert bulk_embed.encode_bulk([]).shape == (0, 2)
+    assert bulk_embed.embedding_dim() == 2
+
+
+def test_encode_threads_leave_the_ingest_workers_their_cores(monkeypatch):
+    monkeypatch.setattr(bulk_embed.os, "cpu_count", lambda: 16)
+    monkeypatch.setattr(bulk_embed, "EMBED_BULK_WORKERS", 2)
+    monkeypatch.setattr(bulk_embed, "EMBED_BULK_TORCH_THREADS", 0)
+    monkeypatch.setattr(bulk_embed, "_reserved", 0)
+    assert bulk_embed.torch_threads() == 8
+    bulk_embed.reserve_cores(6)
+    assert bulk_embed.torch_threads() == 5
+    bulk_embed.reserve_cores(40)
+    assert bulk_embed.torch_threads() == 1
+
+
+def test_token_lengths_use_the_tokenizer_and_fall_back_to_characters():
+    def tok(texts, add_special_tokens, truncation, max_length):
+        return {"input_ids": [list(range(min(len(t.split()) + 2, max_length))) for t in texts]}
+
+    texts = ["one two three", "x " * 500]
+    assert bulk_embed.token_lengths(tok, texts, limit=64).tolist() == [5, 64]
+    # no local tokenizer (remote or ONNX model): about four characters per wordpiece, capped the same way
+    assert bulk_embed.token_lengths(None, texts, limit=64).tolist() == [len(texts[0]) // 4 + 2, 64]
@@ -0,0 +1,25 @@
+from __future__ import annotations
+import os
+import subprocess
+import sys
+
+from app import cli
+
+
+def test_importing_the_app_loads_no_heavy_dependency(tmp_path):
+    code = "import sys, app.main; from app.cli import HEAVY; print('heavy:', [h for h in HEAVY if h in sys.modules])"
+    proc = subprocess.run([sys.executable, "-c", code], cwd=str(cli.ROOT), capture_output=True, text=True,
+                          env={**os.environ, "DATA_DIR": str(tmp_path)}, timeout=120)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    assert "heavy: []" in proc.stdout.splitlines()
+
+
+def test_importtime_lines_are_parsed_with_their_depth():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |     _io",
+        "import time:      2500 |       9000 |   app.services.search",
+        "import time:        40 |      12000 | app.main",
+    ])
+    assert cli._parse_importtime(stderr) == [("_io", 120, 120, 2), ("app.services.search", 2500, 9000, 1),
+                                             ("app.main", 40, 12000, 0)]
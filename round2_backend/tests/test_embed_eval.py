@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.services import embed_eval
+
+
+class _Model:
+    def encode(self, texts, **_):
+        return np.eye(len(texts), 4, dtype="float32")
+
+
+def test_compare_loads_the_reference_model_once(monkeypatch):
+    loaded = []
+    monkeypatch.setattr(embed_eval, "sample_corpus", lambda limit, seed=0: ["a", "b", "c"])
+    monkeypatch.setattr(embed_eval, "load_local_model", lambda backend: loaded.append(backend) or _Model())
+
+    assert embed_eval.compare("torch", k=2)["recallAtK"] == 1.0
+    assert loaded == ["torch"]
+    embed_eval.compare("int8", k=2)
+    assert loaded == ["torch", "torch", "int8"]
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.engines.r1a.src import extract
+
+
+def _page(line_px=10, lines=20, frame_at=0):
+    """A 72 dpi letter page of text lines, optionally inside a 3 px dark frame `frame_at` px in."""
+    page = np.full((792, 612), 255, dtype=np.uint8)
+    for k in range(lines):
+        y = 100 + 2 * line_px * k
+        page[y:y + line_px, 80:400:3] = 0
+    if frame_at is not None:
+        a = frame_at
+        page[a:a + 3, a:612 - a] = page[792 - a - 3:792 - a, a:612 - a] = 0
+        page[a:792 - a, a:a + 3] = page[a:792 - a, 612 - a - 3:612 - a] = 0
+    return page
+
+
+def test_line_height_ignores_scan_borders_and_frames():
+    assert extract._line_height_px(_page(frame_at=None)) == 10
+    assert extract._line_height_px(_page(frame_at=0)) == 10
+    # a ruled frame well inside the margin crop
+    assert extract._line_height_px(_page(frame_at=60)) == 10
+
+
+def test_line_height_without_enough_text_lines_is_no_estimate():
+    assert extract._line_height_px(_page(lines=0, frame_at=0)) is None
+    assert extract._line_height_px(np.zeros((792, 612), dtype=np.uint8)) is None
+
+
+def _text_pdf(path, pages):
+    import fitz
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page()
+        for k, line in enumerate(lines):
+            page.insert_text((72, 72 + 20 * k), line, fontsize=11)
+    doc.save(str(path))
+    doc.close()
+    return path
+
+
+def test_language_is_detected_once_per_page_and_only_when_read(tmp_path, monkeypatch):
+    seen = []
+    monkeypatch.setattr(extract, "_guess_lang", lambda t: seen.append(t) or "en")
+    pdf = _text_pdf(tmp_path / "a.pdf", [["First heading", "Some body text here."], ["Second page line."]])
+
+    spans = extract.extract_spans(pdf, workers=1)
+    assert len(spans) >= 3 and seen == []
+
+    assert {s.lang for s in spans} == {"en"}
+    assert len(seen) == 2
+    assert "First heading" in seen[0] and "Some body text here." in seen[0]
+
+
+def test_a_span_built_on_its_own_samples_its_own_text(monkeypatch):
+    monkeypatch.setattr(extract, "_guess_lang", lambda t: f"lang-of-{t}")
+    span = extract.Span("bonjour", 1, (0, 0, 1, 1), 10.0, "Helv", False, False)
+    assert span.lang == "lang-of-bonjour"
+
+
+def test_page_cache_is_keyed_by_page_content_not_by_file(tmp_path, monkeypatch):
+    cache = tmp_path / "pages"
+    a = _text_pdf(tmp_path / "a.pdf", [["Shared cover page."], ["Only in a."]])
+    b = _text_pdf(tmp_path / "b.pdf", [["Shared cover page."], ["Only in b."]])
+    first = [(s.page, s.text) for s in extract.extract_spans(a, workers=1, cache_dir=cache)]
+
+    real = extract._extract_page
+    extracted = []
+    monkeypatch.setattr(extract, "_extract_page", lambda page, no, dpi: extracted.append(no) or real(page, no, dpi))
+    assert [(s.page, s.text) for s in extract.extract_spans(a, workers=1, cache_dir=cache)] == first
+    assert extracted == []
+
+    spans = extract.extract_spans(b, workers=1, cache_dir=cache)
+    assert extracted == [2]
+    assert [(s.page, s.text) for s in spans] == [(1, "Shared cover page."), (2, "Only in b.")]
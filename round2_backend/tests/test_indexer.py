@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.services import indexer, sentence_cache
+
+
+def test_each_distinct_sentence_is_encoded_once_across_documents(tmp_path, monkeypatch):
+    monkeypatch.setattr(sentence_cache, "PATH", tmp_path / "sentences.db")
+    monkeypatch.setattr(sentence_cache, "_ready", False)
+    monkeypatch.setattr(sentence_cache, "ENABLED", True)
+    encoded = []
+
+    def encode(texts):
+        encoded.extend(texts)
+        return np.array([[len(t), ord(t[0])] for t in texts], dtype="float32")
+
+    monkeypatch.setattr(indexer, "encode_bulk", encode)
+
+    def embed(texts):
+        return indexer._embed_sentences(texts, [sentence_cache.sentence_key(t, "m") for t in texts])
+
+    doc1 = ["Copyright notice.", "Intro text.", "Copyright notice."]
+    doc2 = ["Copyright notice.", "Other text."]
+    out1, out2 = embed(doc1), embed(doc2)
+
+    assert encoded == ["Copyright notice.", "Intro text.", "Other text."]
+    np.testing.assert_array_equal(out1, [[len(t), ord(t[0])] for t in doc1])
+    np.testing.assert_array_equal(out2, [[len(t), ord(t[0])] for t in doc2])
+    assert out1.dtype == np.float32
@@ -0,0 +1,191 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+import asyncio
+import io
+import json
+import threading
+import time
+import zipfile
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.routers import status
+from app.services import artifact_cache, ingest, jobs
+from app.services.scheduler import PRIORITY_BULK
+
+
+def _upload(tmp_path, n):
+    return f"d{n}", f"j{n}", f"copy{n}.pdf", tmp_path / f"d{n}.pdf", PRIORITY_BULK
+
+
+def test_concurrent_uploads_of_one_file_index_it_once(stores, tmp_path):
+    job_store, doc_registry = stores
+    start = threading.Barrier(8)
+
+    def upload(n):
+        start.wait()
+        return ingest._dedupe("sha", *_upload(tmp_path, n))
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(upload, range(8)))
+
+    winners = [n for n, r in enumerate(results) if r is None]
+    assert len(winners) == 1
+    winner = f"j{winners[0]}"
+    assert {r["jobId"] for r in results if r} == {winner}
+    assert list(job_store.get_many([f"j{n}" for n in range(8)])) == [winner]
+    assert len(doc_registry.aliases(f"d{winners[0]}")) == 7
+
+
+def test_claim_whose_job_row_is_missing_counts_as_in_progress(stores, tmp_path):
+    _, doc_registry = stores
+    doc_registry.claim("sha", "d0", "j0", "a.pdf")
+    assert ingest._dedupe("sha", *_upload(tmp_path, 1)) == {"jobId": "j0", "docId": "d0", "duplicate": True}
+
+
+def test_upload_replaces_a_copy_that_failed(stores, tmp_path):
+    job_store, doc_registry = stores
+    assert ingest._dedupe("sha", *_upload(tmp_path, 0)) is None
+    job_store.update("j0", {"status": "error", "error": "boom"})
+
+    assert ingest._dedupe("sha", *_upload(tmp_path, 1)) is None
+    assert doc_registry.lookup("sha")["job_id"] == "j1"
+    assert job_store.get("j1")["status"] == "queued"
+
+
+def test_bulk_upload_with_a_bad_file_queues_nothing(stores, monkeypatch):
+    job_store, _ = stores
+    monkeypatch.setattr(ingest, "_admit", lambda n=1: None)
+    before = set((ingest.DATA_DIR / "docs").glob("*.pdf"))
+    files = [UploadFile(io.BytesIO(b"%PDF-1.4 one"), filename="a.pdf"),
+             UploadFile(io.BytesIO(b"not a pdf"), filename="b.pdf"),
+             UploadFile(io.BytesIO(b"%PDF-1.4 three"), filename="c.pdf")]
+
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(ingest.handle_upload_many(files))
+
+    assert e.value.status_code == 400
+    assert set((ingest.DATA_DIR / "docs").glob("*.pdf")) == before
+    with closing(job_store._connect()) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 0
+
+
+def _pdf(tag):
+    return b"%PDF-1.4\n" + tag.encode() + b"\nstartxref\n0\n%%EOF\n"
+
+
+def _zip_upload(members):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        for name, data in members:
+            z.writestr(name, data)
+    buf.seek(0)
+    return UploadFile(buf, filename="batch.zip")
+
+
+@pytest.fixture
+def zip_ingest(stores, monkeypatch):
+    """Zip uploads with the scheduler replaced by one that finishes every job at once."""
+    monkeypatch.setattr(ingest, "_admit", lambda n=1: None)
+
+    def kickoff(doc_id, pdf_path, job_id, orig_name=None, priority=0, stage=None):
+        ingest._write_job(job_id, {"jobId": job_id, "docId": doc_id, "status": "done", "progress": 100})
+
+    monkeypatch.setattr(ingest, "kickoff_indexing", kickoff)
+    return stores
+
+
+def _wait_finished(batch_id):
+    deadline = time.monotonic() + 30
+    while not jobs.summarize(jobs.batch_jobs(batch_id))["finished"]:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    return jobs.summarize(jobs.batch_jobs(batch_id))
+
+
+def test_zip_members_get_persisted_states_and_duplicates_point_at_the_original(zip_ingest):
+    job_store, _ = zip_ingest
+    results = asyncio.run(ingest.handle_upload_zip(_zip_upload(
+        [("a.pdf", _pdf("a")), ("copy/a.pdf", _pdf("a")), ("bad.pdf", b"nope"), ("b.pdf", _pdf("b"))])))
+
+    a, copy, bad, b = results
+    assert copy == {"jobId": a["jobId"], "docId": a["docId"], "duplicate": True, "batchId": a["batchId"]}
+    summary = _wait_finished(a["batchId"])
+    assert summary["total"] == 3
+    assert summary["counts"] == {"done": 2, "error": 1}
+    # what another worker (or this one after a restart) would see
+    stored = job_store.get_many([a["jobId"], bad["jobId"], b["jobId"]])
+    assert [stored[r["jobId"]]["status"] for r in (a, bad, b)] == ["done", "error", "done"]
+    assert stored[bad["jobId"]]["error"] == "Not a PDF file: bad.pdf"
+    assert all(row["source"] is None for row in stored.values() if row["status"] == "done")
+
+
+def test_zip_member_already_uploaded_redirects_to_the_original(zip_ingest):
+    job_store, _ = zip_ingest
+    first = asyncio.run(ingest.handle_upload_zip(_zip_upload([("a.pdf", _pdf("a"))])))[0]
+    _wait_finished(first["batchId"])
+
+    # the copy is only recognised once its bytes are hashed on the way out of the archive
+    again, c = asyncio.run(ingest.handle_upload_zip(_zip_upload([("renamed.pdf", _pdf("a")), ("c.pdf", _pdf("c"))])))
+    assert "duplicate" not in again
+    summary = _wait_finished(again["batchId"])
+    assert summary["counts"] == {"done": 2}
+    st = status.get_status(again["jobId"])
+    assert (st["docId"], st["status"], st["duplicate"], st["duplicateOf"]) == (first["docId"], "done", True,
+                                                                              first["jobId"])
+    assert not (ingest.DATA_DIR / "docs" / f"{again['docId']}.pdf").exists()
+    assert job_store.get(again["jobId"])["source"] is None
+    assert status.get_status(first["jobId"])["aliases"] == ["renamed.pdf"]
+
+
+def test_zip_members_not_yet_extracted_resume_after_a_crash(zip_ingest, monkeypatch):
+    job_store, _ = zip_ingest
+    with monkeypatch.context() as m:
+        # the process dies right after answering, before any member is extracted
+        m.setattr(ingest, "_expand_zip", lambda *a: None)
+        results = asyncio.run(ingest.handle_upload_zip(_zip_upload([("a.pdf", _pdf("a")), ("b.pdf", _pdf("b"))])))
+    ids = [r["jobId"] for r in results]
+    with closing(job_store._connect()) as conn:
+        conn.execute("UPDATE jobs SET owner = 'gone-host:1:1' WHERE job_id IN (?, ?)", ids)
+
+    assert ingest.resume_pending() == 2
+    assert _wait_finished(results[0]["batchId"])["counts"] == {"done": 2}
+
+
+def test_backfill_registers_documents_indexed_before_the_registry(stores, tmp_path, monkeypatch):
+    job_store, doc_registry = stores
+    monkeypatch.setattr(ingest, "DATA_DIR", tmp_path)
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "meta").mkdir()
+
+    def doc(doc_id, data, indexed=True, orig=None):
+        (tmp_path / "docs" / f"{doc_id}.pdf").write_bytes(data)
+        if indexed:
+            (tmp_path / "meta" / f"{doc_id}_sentences.json").write_text('{"sentences": []}')
+            (tmp_path / "meta" / f"{doc_id}_sections.json").write_text(json.dumps({"origName": orig}))
+
+    doc("old", _pdf("x"), orig="report.pdf")
+    doc("oldcopy", _pdf("x"), orig="report-final.pdf")
+    doc("partial", _pdf("y"), indexed=False)
+    doc("failed", _pdf("z"))
+    job_store.create("jf", "failed", tmp_path / "docs" / "failed.pdf", "f.pdf", PRIORITY_BULK)
+    job_store.update("jf", {"status": "error", "error": "boom"})
+
+    assert ingest.backfill_registry() == 1
+    assert ingest.backfill_registry() == 0
+    sha = artifact_cache.file_sha256(tmp_path / "docs" / "old.pdf")
+    entry = doc_registry.lookup(sha)
+    assert entry["doc_id"] in ("old", "oldcopy")
+    assert doc_registry.doc_ids() == {entry["doc_id"]}
+    assert job_store.get(entry["job_id"])["status"] == "done"
+    with closing(job_store._connect()) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 2
+
+    # a re-upload of the old file is now a duplicate whose job reports done, with every name it went by
+    dup = ingest._dedupe(sha, "new", "jnew", "again.pdf", tmp_path / "docs" / "new.pdf", PRIORITY_BULK)
+    assert dup == {"jobId": entry["job_id"], "docId": entry["doc_id"], "duplicate": True}
+    st = status.get_status(entry["job_id"])
+    assert st["status"] == "done"
+    assert set(st["aliases"]) == {"report.pdf", "report-final.pdf", "again.pdf"} - {entry["orig_name"]}
@@ -0,0 +1,48 @@
+from __future__ import annotations
+from contextlib import closing
+import os
+import socket
+
+
+def _set_owner(job_store, job_id, owner):
+    with closing(job_store._connect()) as conn:
+        conn.execute("UPDATE jobs SET owner = ? WHERE job_id = ?", (owner, job_id))
+
+
+def test_jobs_of_a_restarted_process_with_the_same_pid_are_resumed(stores, tmp_path):
+    job_store, _ = stores
+    job_store.create("j1", "d1", tmp_path / "a.pdf", "a.pdf", 5)
+    job_store.update("j1", {"status": "running", "stage": "embedded", "progress": 80})
+    # same hostname and pid as this process (PID 1 in a restarted container), different boot
+    _set_owner(job_store, "j1", f"{socket.gethostname()}:{os.getpid()}:0")
+
+    claimed = job_store.claim_unfinished()
+
+    assert [j["job_id"] for j in claimed] == ["j1"]
+    assert claimed[0]["stage"] == "embedded"
+    assert job_store.get("j1")["owner"] == job_store._OWNER
+
+
+def test_jobs_owned_by_this_process_are_left_alone(stores, tmp_path):
+    job_store, _ = stores
+    job_store.create("j1", "d1", tmp_path / "a.pdf", "a.pdf", 5)
+    assert job_store.claim_unfinished() == []
+
+
+def test_stage_checkpoints_never_move_backwards(stores, tmp_path):
+    job_store, _ = stores
+    job_store.create("j1", "d1", tmp_path / "a.pdf", "a.pdf", 5)
+    job_store.update("j1", {"stage": "embedded"})
+    job_store.update("j1", {"stage": "sectioned", "progress": 30})
+    assert job_store.get("j1")["stage"] == "embedded"
+
+
+def test_resume_gives_up_after_max_attempts(stores, tmp_path, monkeypatch):
+    job_store, _ = stores
+    monkeypatch.setattr(job_store, "MAX_ATTEMPTS", 1)
+    job_store.create("j1", "d1", tmp_path / "a.pdf", "a.pdf", 5)
+    for _ in range(2):
+        _set_owner(job_store, "j1", "gone-host:1:1")
+        claimed = job_store.claim_unfinished()
+    assert claimed == []
+    assert job_store.get("j1")["status"] == "error"
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from app.services import onnx_backend
+from app.services.onnx_backend import OnnxEncoder
+
+VOCAB = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + list("abcdefghijklmnopqrstuvwxyz")
+
+
+class _Tokenizer:
+    """One token per character, right-padded with 0."""
+
+    def __call__(self, texts, padding, truncation, max_length, return_tensors):
+        n = min(max_length, max(len(t) for t in texts))
+        ids = np.array([[ord(c) for c in t[:n]] + [0] * (n - len(t[:n])) for t in texts])
+        return {"input_ids": ids, "attention_mask": (ids > 0).astype("int64")}
+
+
+class _Session:
+    """Hidden state of each token is (code, 1); padding positions hold garbage."""
+
+    def __init__(self):
+        self.batches = []
+
+    def run(self, _, feed):
+        ids = feed["input_ids"]
+        self.batches.append(len(ids))
+        hidden = np.stack([ids, np.ones_like(ids)], axis=-1).astype("float32")
+        hidden[ids == 0] = 1000.0
+        return [hidden]
+
+
+def _encoder(pooling="mean", normalize=False):
+    enc = OnnxEncoder.__new__(OnnxEncoder)
+    enc.meta = {"inputs": ["input_ids", "attention_mask"], "pooling": pooling, "normalize": normalize,
+                "max_seq_length": 8}
+    enc.tokenizer = _Tokenizer()
+    enc.session = _Session()
+    return enc
+
+
+def test_mean_pooling_ignores_padding_and_keeps_input_order():
+    enc = _encoder()
+    out = enc.encode(["a", "abc", "ab"], batch_size=2)
+    a = ord("a")
+    np.testing.assert_allclose(out, [[a, 1], [a + 1, 1], [a + 0.5, 1]])
+    assert enc.session.batches == [2, 1]
+
+
+def test_cls_pooling_and_normalization():
+    enc = _encoder(pooling="cls", normalize=True)
+    out = enc.encode("ba")
+    assert out.shape == (2,)
+    np.testing.assert_allclose(out, np.array([ord("b"), 1]) / np.hypot(ord("b"), 1), rtol=1e-6)
+
+
+def test_export_matches_the_torch_model(tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnx")
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizer
+
+    (tmp_path / "vocab.txt").write_text("\n".join(VOCAB))
+    BertTokenizer(str(tmp_path / "vocab.txt")).save_pretrained(str(tmp_path / "hf"))
+    BertModel(BertConfig(vocab_size=len(VOCAB), hidden_size=16, num_hidden_layers=1, num_attention_heads=2,
+                         intermediate_size=32)).save_pretrained(str(tmp_path / "hf"))
+    st = SentenceTransformer(modules=[models.Transformer(str(tmp_path / "hf"), max_seq_length=32),
+                                      models.Pooling(16), models.Normalize()], device="cpu")
+    st.save(str(tmp_path / "st"))
+
+    onnx_backend.export(str(tmp_path / "st"), tmp_path / "onnx", quantize=False)
+    texts = ["a b c", "hello world", "z"]
+    got = OnnxEncoder(tmp_path / "onnx").encode(texts)
+    np.testing.assert_allclose(got, st.encode(texts, normalize_embeddings=True), atol=1e-4)
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.services import embeddings, query_cache as qc
+
+
+def test_queries_that_embed_identically_share_a_key():
+    key = qc.QueryCache.key
+    assert key("  Solar  Panels\n", "m") == key("solar panels", "m") == key("ＳＯＬＡＲ panels", "m")
+    assert key("solar panels", "m") != key("solar panels", "m@onnx")
+
+
+def test_least_recently_used_entries_are_evicted_first():
+    cache = qc.QueryCache(max_items=2, spill=False)
+    for k in "abc":
+        if k == "c":
+            assert cache.get("a") is not None
+        cache.put(k, np.ones(3))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats() == {"hits": 3, "misses": 1, "diskHits": 0, "evictions": 1, "size": 2, "capacity": 2}
+
+
+def test_only_uncached_queries_reach_the_model(monkeypatch):
+    monkeypatch.setattr(qc, "query_cache", qc.QueryCache(max_items=8, spill=False))
+    encoded = []
+
+    def encode(queries):
+        encoded.append(list(queries))
+        return np.array([[len(q), 1.0] for q in queries], dtype="float32")
+
+    monkeypatch.setattr(embeddings, "_encode_uncached", encode)
+    first = embeddings.encode_queries(["Solar panels", "wind"])
+    again = embeddings.encode_queries(["wind", "solar  PANELS", "tides"])
+
+    assert encoded == [["Solar panels", "wind"], ["tides"]]
+    np.testing.assert_array_equal(again[:2], first[::-1])
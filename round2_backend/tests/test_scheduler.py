@@ -0,0 +1,70 @@
+from __future__ import annotations
+import threading
+
+import numpy as np
+
+from app.services import scheduler as sched
+from tests import pool_helpers
+
+
+class _Writer:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, vectors, mapping):
+        self.rows.extend(mapping)
+        return len(mapping)
+
+
+def _run_one(monkeypatch, stores, tmp_path, prepare):
+    job_store, _ = stores
+    writer = _Writer()
+    monkeypatch.setattr(sched, "get_writer", lambda: writer)
+    monkeypatch.setattr(sched, "_prepare_in_worker", prepare)
+    done = threading.Event()
+    states = []
+
+    def on_progress(job_id, payload):
+        states.append(payload)
+        if payload.get("status") in ("done", "error"):
+            done.set()
+
+    pdf = tmp_path / "a.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    job_store.create("j1", "d1", pdf, "a.pdf", sched.PRIORITY_BULK)
+    s = sched.IngestScheduler(on_progress=on_progress, workers=1, mode="process")
+    try:
+        s.submit("j1", "d1", pdf)
+        assert done.wait(120)
+        return s, writer, states
+    finally:
+        s.shutdown()
+
+
+def test_dead_worker_gets_a_fresh_pool_and_the_job_retries(monkeypatch, stores, tmp_path):
+    s, writer, states = _run_one(monkeypatch, stores, tmp_path, pool_helpers.die_once)
+    assert states[-1]["status"] == "done"
+    assert writer.rows == [{"docId": "d1", "sectionId": "s1", "sentIdx": 0}]
+
+
+def test_job_that_keeps_killing_workers_errors_out(monkeypatch, stores, tmp_path):
+    monkeypatch.setattr(sched, "INGEST_POOL_RETRIES", 1)
+    s, writer, states = _run_one(monkeypatch, stores, tmp_path, pool_helpers.always_die)
+    assert states[-1]["status"] == "error"
+    assert "died 2 times" in states[-1]["error"]
+    assert writer.rows == []
+
+
+def test_with_a_bulk_encode_pool_workers_leave_embedding_to_the_parent(monkeypatch, stores, tmp_path):
+    monkeypatch.setattr(sched.bulk_embed, "EMBED_BULK_WORKERS", 2)
+    calls = []
+
+    def prepare_here(doc_id, pdf_path, job_id, progress_cb=None, orig_name=None, resume_stage=None):
+        calls.append(resume_stage)
+        return np.ones((1, 384), dtype="float32"), [{"docId": doc_id, "sectionId": "s1", "sentIdx": 0}]
+
+    monkeypatch.setattr(sched, "prepare_document", prepare_here)
+    s, writer, states = _run_one(monkeypatch, stores, tmp_path, pool_helpers.sentences_only)
+    assert states[-1]["status"] == "done"
+    assert calls == ["sentences"]
+    assert writer.rows == [{"docId": "d1", "sectionId": "s1", "sentIdx": 0}]
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import pytest
+
+from app.services import search
+from app.services import vector_store as vs
+from tests.conftest import unit_vectors
+
+
+def _rows(doc_id, n):
+    return [{"docId": doc_id, "sectionId": "s1", "sentIdx": i} for i in range(n)]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(vs.VectorStore, "_maybe_compact", lambda self: None)
+    return vs.VectorStore(tmp_path / "index")
+
+
+def test_holder_picks_up_new_segments_and_keeps_loaded_ones(store):
+    holder = search._IndexHolder(store.index_dir)
+    with pytest.raises(RuntimeError, match="Ingest PDFs first"):
+        holder.get()
+
+    vecs = unit_vectors(20)
+    store.add(vecs[:10], _rows("a", 10))
+    first = holder.get()
+    assert holder.get() is first
+
+    store.add(vecs[10:], _rows("b", 10))
+    second = holder.get()
+    assert second is not first
+    assert [s.name for s in second.segments][:1] == [first.segments[0].name]
+    # the unchanged segment is reused, not read from disk again
+    assert second.segments[0] is first.segments[0]
+    assert second.search(vecs[15:16], 1)[0][1]["docId"] == "b"
@@ -0,0 +1,52 @@
+from __future__ import annotations
+from contextlib import closing
+import sqlite3
+
+import numpy as np
+import pytest
+
+from app.services import sentence_cache
+from tests.conftest import unit_vectors
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(sentence_cache, "PATH", tmp_path / "sentences.db")
+    monkeypatch.setattr(sentence_cache, "_ready", False)
+    monkeypatch.setattr(sentence_cache, "ENABLED", True)
+    return sentence_cache
+
+
+def test_vectors_are_stored_in_the_index_storage_dtype(cache, monkeypatch):
+    vecs = unit_vectors(2)
+    monkeypatch.setattr(cache.ann, "INDEX_STORAGE", "sq8")
+    cache.put_many([("a", vecs[0])])
+    monkeypatch.setattr(cache.ann, "INDEX_STORAGE", "fp32")
+    cache.put_many([("b", vecs[1])])
+
+    with closing(sqlite3.connect(str(cache.PATH))) as conn:
+        sizes = dict(conn.execute("SELECT key, length(vec) FROM vecs"))
+    assert sizes == {"a": 384 * 2, "b": 384 * 4}
+    got = cache.get_many(["a", "b", "missing"])
+    assert set(got) == {"a", "b"} and {v.dtype for v in got.values()} == {np.dtype("float32")}
+    np.testing.assert_allclose(got["a"], vecs[0], atol=1e-3)
+    np.testing.assert_array_equal(got["b"], vecs[1])
+
+
+def test_convert_rewrites_rows_cached_under_another_storage(cache):
+    vecs = unit_vectors(3)
+    cache.put_many(zip("abc", vecs))
+
+    assert cache.convert("float16") == 3
+    assert cache.convert("float16") == 0
+    np.testing.assert_allclose(np.vstack([cache.get_many(["a", "b", "c"])[k] for k in "abc"]), vecs, atol=1e-3)
+
+
+def test_a_cache_written_before_the_dtype_column_still_reads(cache):
+    vec = unit_vectors(1)[0]
+    with closing(sqlite3.connect(str(cache.PATH))) as conn:
+        conn.execute("CREATE TABLE vecs (key TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+        conn.execute("INSERT INTO vecs VALUES ('old', ?)", (vec.tobytes(),))
+        conn.commit()
+
+    np.testing.assert_array_equal(cache.get_many(["old"])["old"], vec)
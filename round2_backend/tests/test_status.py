@@ -0,0 +1,102 @@
+from __future__ import annotations
+from uuid import uuid4
+import asyncio
+import json
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.routers import status
+from app.services import jobs
+from app.services.scheduler import PRIORITY_BULK
+
+
+class _Request:
+    async def is_disconnected(self):
+        return False
+
+
+def _job(job_store, status_="queued"):
+    job_id = uuid4().hex[:12]
+    job_store.create(job_id, f"d-{job_id}", f"/tmp/{job_id}.pdf", "a.pdf", PRIORITY_BULK)
+    if status_ != "queued":
+        job_store.update(job_id, {"status": status_})
+    return job_id
+
+
+def _events(job_ids, after_first):
+    """Every SSE event for job_ids; after_first runs on a thread once the stream has started."""
+    async def collect():
+        out = []
+        async for chunk in status._event_stream(_Request(), job_ids):
+            if chunk.startswith(":"):
+                continue
+            event, data = chunk.split("\n")[:2]
+            out.append((event[len("event: "):], json.loads(data[len("data: "):])))
+            if len(out) == 1:
+                threading.Thread(target=after_first).start()
+        return out
+    return asyncio.run(asyncio.wait_for(collect(), 10))
+
+
+def test_progress_is_pushed_as_it_is_recorded(stores):
+    job_store, _ = stores
+    job_id = _job(job_store)
+    jobs.record(job_id, {"jobId": job_id, "status": "running", "progress": 5})
+
+    def work():
+        for p in (40, 80):
+            jobs.record(job_id, {"jobId": job_id, "status": "running", "progress": p})
+        jobs.record(job_id, {"jobId": job_id, "status": "done", "progress": 100})
+
+    events = _events([job_id], work)
+    assert [(e, d.get("progress")) for e, d in events] == [
+        ("progress", 5), ("progress", 40), ("progress", 80), ("progress", 100), ("end", None)]
+
+
+def test_jobs_run_by_another_worker_are_followed_through_the_store(stores, monkeypatch):
+    job_store, _ = stores
+    monkeypatch.setattr(status, "STORE_POLL_S", 0.05)
+    job_id = _job(job_store, "running")
+
+    events = _events([job_id], lambda: job_store.update(job_id, {"status": "done", "progress": 100}))
+    assert [(e, d.get("status")) for e, d in events] == [("progress", "running"), ("progress", "done"), ("end", None)]
+
+
+def test_batch_status_summarizes_its_jobs(stores):
+    job_store, _ = stores
+    running, done, failed = _job(job_store), _job(job_store, "done"), _job(job_store)
+    jobs.record(running, {"jobId": running, "status": "running", "progress": 40})
+    job_store.update(done, {"progress": 100})
+    job_store.update(failed, {"status": "error", "error": "boom"})
+    batch_id = jobs.open_batch([running, done, failed])
+
+    summary = status.batch_status_by_id(batch_id)
+    assert summary["batchId"] == batch_id
+    assert (summary["total"], summary["counts"], summary["finished"]) == (
+        3, {"running": 1, "done": 1, "error": 1}, False)
+    assert summary["progress"] == round((40 + 100 + 0) / 3)
+    assert [j["jobId"] for j in summary["jobs"]] == [running, done, failed]
+    assert summary["jobs"][2]["error"] == "boom"
+
+    # the batch is also known to workers that did not take the upload
+    jobs.registry._batches.pop(batch_id)
+    assert jobs.batch_jobs(batch_id) == [running, done, failed]
+
+
+def test_batch_status_by_ids_and_its_limits(stores, monkeypatch):
+    job_store, _ = stores
+    a = _job(job_store, "done")
+    summary = status.batch_status(status.BatchStatusRequest(jobIds=[a, a, "nope"]))
+    assert summary["total"] == 2
+    assert summary["counts"] == {"done": 1, "unknown": 1}
+
+    monkeypatch.setattr(status, "MAX_BATCH_JOBS", 1)
+    for ids in ([], ["x", "y"]):
+        with pytest.raises(HTTPException) as e:
+            status.batch_status(status.BatchStatusRequest(jobIds=ids))
+        assert e.value.status_code == 400
+    with pytest.raises(HTTPException) as e:
+        status.batch_status_by_id("missing")
+    assert e.value.status_code == 404
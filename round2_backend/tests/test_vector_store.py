@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import pytest
+
+from app.services import vector_store as vs
+from tests.conftest import unit_vectors
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # compaction runs inline in these tests, not on the background thread
+    monkeypatch.setattr(vs.VectorStore, "_maybe_compact", lambda self: None)
+    return vs.VectorStore(tmp_path / "index")
+
+
+def _rows(doc_id, n):
+    return [{"docId": doc_id, "sectionId": "s1", "sentIdx": i} for i in range(n)]
+
+
+def test_add_then_search_finds_the_vector(store):
+    vecs = unit_vectors(20)
+    store.add(vecs[:10], _rows("a", 10))
+    store.add(vecs[10:], _rows("b", 10))
+
+    hits = store.search(vecs[13:14], topk=1)
+    assert hits[0][0] == 13
+    assert store._snapshot().search(vecs[13:14], 1)[0][1] == {"vecId": 13, "docId": "b", "sectionId": "s1",
+                                                              "sentIdx": 3}
+    assert vs.read_manifest(store.index_dir)["ntotal"] == 20
+
+
+def test_compaction_merges_segments_and_keeps_ids(store, monkeypatch):
+    monkeypatch.setattr(vs, "SEGMENT_BASE", 10)
+    monkeypatch.setattr(vs, "MERGE_FACTOR", 2)
+    vecs = unit_vectors(30)
+    for k in range(3):
+        store.add(vecs[10 * k:10 * (k + 1)], _rows(f"d{k}", 10))
+
+    assert store.compact() == 1
+    segments = vs.read_manifest(store.index_dir)["segments"]
+    assert [e["ntotal"] for e in segments] == [20, 10]
+    assert sorted(p.name for p in store.seg_dir.glob("*.index")) == sorted(f"{e['name']}.index" for e in segments)
+    for i in (0, 15, 25):
+        assert store.search(vecs[i:i + 1], topk=1)[0][0] == i
+
+
+def test_adding_a_document_again_is_a_no_op(store):
+    vecs = unit_vectors(10)
+    store.add(vecs, _rows("a", 10))
+    gen = vs.read_generation(store.index_dir)
+
+    # a job resumed after its rows were committed but before the "indexed" checkpoint
+    store.add(vecs, _rows("a", 10))
+    assert vs.read_generation(store.index_dir) == gen
+
+    # a fresh store (another worker, or after a restart) reads docIds back from the segment files
+    other = vs.VectorStore(store.index_dir)
+    other.add(vecs, _rows("a", 10))
+    other.add(unit_vectors(4, seed=1), _rows("b", 2) + _rows("a", 2))
+    assert vs.read_manifest(store.index_dir)["ntotal"] == 12
+    doc_of = {r["vecId"]: r["docId"] for seg in other._snapshot().segments for r in seg.rows}
+    assert (doc_of[10], doc_of[11]) == ("b", "b")
+
+
+def test_search_on_an_old_snapshot_survives_compaction(store, monkeypatch):
+    monkeypatch.setattr(vs.ann, "INDEX_STORAGE", "sq8")
+    monkeypatch.setattr(vs, "MERGE_FACTOR", 2)
+    vecs = unit_vectors(20)
+    store.add(vecs[:10], _rows("a", 10))
+    store.add(vecs[10:], _rows("b", 10))
+    old = store._snapshot()
+    assert all(seg.archive is not None for seg in old.segments)
+
+    assert store.compact() == 1
+    assert not any((store.seg_dir / f"{seg.name}.vecs.npy").exists() for seg in old.segments)
+    # a query that picked up the snapshot before the swap still rescores against the retired archives
+    assert old.search(vecs[12:13], 1)[0][1]["vecId"] == 12
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_document_made_only_of_repeated_sentences(store, monkeypatch, mmap):
+    monkeypatch.setattr(vs, "INDEX_DEDUP_SENTENCES", True)
+    monkeypatch.setattr(vs, "INDEX_MMAP", mmap)
+    monkeypatch.setattr(vs.ann, "INDEX_STORAGE", "sq8")
+    vecs = unit_vectors(6)
+    rows = [{**r, "h": f"h{r['sentIdx']}"} for r in _rows("a", 6)]
+    store.add(vecs, rows)
+    # every sentence of b is already indexed, so its segment holds aliases and no vectors
+    store.add(vecs, [{**r, "docId": "b"} for r in rows])
+
+    segments = vs.read_manifest(store.index_dir)["segments"]
+    assert [(e["ntotal"], e["aliases"]) for e in segments] == [(6, 0), (0, 6)]
+    assert [r["docId"] for _, r in store._snapshot().search(vecs[2:3], 1)] == ["a", "b"]
+    assert vs.ann.measure_recall(store._snapshot(), n_queries=4, k=2)["vectors"] == 6
+
+    # compaction, and a storage migration that rebuilds every segment
+    monkeypatch.setattr(vs, "MERGE_FACTOR", 2)
+    assert store.compact() == 1
+    monkeypatch.setattr(vs.ann, "INDEX_STORAGE", "fp16")
+    store.add(unit_vectors(2, seed=1), _rows("c", 2))
+    store.add(vecs[:2], [{**r, "docId": "d"} for r in rows[:2]])
+    assert store.compact() >= 1
+    assert {e["storage"] for e in vs.read_manifest(store.index_dir)["segments"]} == {"fp16"}
+    assert {r["docId"] for _, r in store._snapshot().search(vecs[0:1], 1)} == {"a", "b", "d"}
+
+
+def test_faiss_without_in_place_mmap_falls_back_and_says_so(store, monkeypatch, capsys):
+    import faiss
+    vecs = unit_vectors(8)
+    store.add(vecs, _rows("a", 8))
+    monkeypatch.setattr(vs, "INDEX_MMAP", True)
+    monkeypatch.setattr(vs, "_mmap_warned", False)
+    if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        assert vs.mmap_status() == "on"
+        monkeypatch.delattr(faiss, "IO_FLAG_MMAP_IFC")
+
+    assert vs.mmap_status() == "partial"
+    assert "no IO_FLAG_MMAP_IFC" in capsys.readouterr().out
+    assert vs.VectorStore(store.index_dir).search(vecs[5:6], topk=1)[0][0] == 5
+
+
+def test_adding_a_document_leaves_earlier_segments_untouched(store):
+    vecs = unit_vectors(20)
+    store.add(vecs[:10], _rows("a", 10))
+    first = vs.read_manifest(store.index_dir)["segments"][0]["name"]
+    before = {p.name: p.stat().st_mtime_ns for p in store.seg_dir.glob(f"{first}.*")}
+
+    store.add(vecs[10:], _rows("b", 10))
+    assert [e["name"] for e in vs.read_manifest(store.index_dir)["segments"]][0] == first
+    assert {p.name: p.stat().st_mtime_ns for p in store.seg_dir.glob(f"{first}.*")} == before
+
+
+def test_a_single_file_index_is_adopted_as_the_first_segment(tmp_path):
+    import faiss
+    vecs = unit_vectors(5)
+    index_dir = tmp_path / "index"
+    index_dir.mkdir()
+    index = faiss.IndexFlatIP(384)
+    index.add(vecs)
+    faiss.write_index(index, str(index_dir / "faiss.index"))
+    (index_dir / "mapping.jsonl").write_text("".join(f'{{"vecId": {i}, "docId": "old"}}\n' for i in range(5)))
+
+    store = vs.VectorStore(index_dir)
+    assert not (index_dir / "faiss.index").exists()
+    meta = vs.read_manifest(index_dir)
+    assert [(e["ntotal"], e["kind"]) for e in meta["segments"]] == [(5, "flat")]
+    assert store._snapshot().search(vecs[3:4], 1)[0][1]["docId"] == "old"
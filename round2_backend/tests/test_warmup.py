@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from app.services import warmup
+
+
+def test_failed_warm_up_is_retried_until_ready(monkeypatch):
+    monkeypatch.setattr(warmup, "_ready", warmup.threading.Event())
+    monkeypatch.setattr(warmup, "_state", {"state": "pending", "steps": {}, "error": None})
+    monkeypatch.setattr(warmup, "WARMUP_RETRY_S", 0.01)
+    calls = []
+
+    def flaky_model():
+        calls.append(1)
+        if len(calls) < 3:
+            raise OSError("model not downloaded yet")
+        return {}
+
+    monkeypatch.setattr(warmup, "_warm_model", flaky_model)
+    monkeypatch.setattr(warmup, "_warm_index", lambda: {"vectors": 0})
+    monkeypatch.setattr(warmup, "_warm_sentences", lambda: {"docs": 0})
+    warmup._run()
+
+    assert warmup.is_ready()
+    assert len(calls) == 3
+    status = warmup.status()
+    assert (status["state"], status["error"], status["attempts"]) == ("ready", None, 2)